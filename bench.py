@@ -0,0 +1,233 @@
+#!/bin/python3
+
+# benchmarks of task_list operations on generated to-do lists
+#
+# usage:
+#   python bench.py [-sizes <n,n,...>] [-shapes <shape,...>] [-reps <int>]
+#       [-out <file>] [-baseline <file>] [-threshold <float>]
+#
+#   times each operation on lists of each shape and size, writes the
+#   results to <file> (default bench_results.json) as JSON, and compares
+#   them with the baseline (default bench_baseline.json) if there is one
+#
+#   to record a baseline, run with '-out bench_baseline.json'
+#   exits with status 1 if anything got slower than 'threshold' times
+#   the baseline (default 1.5)
+
+import os
+import sys
+import time
+import json
+import random
+import platform
+import datetime
+import tempfile
+import statistics
+
+from tasker import *
+
+# shapes of list to generate, see 'make_list'
+shapes = ['wide', 'deep', 'realistic']
+
+# default sizes, in number of tasks
+#	10^6 takes a few minutes, so ask for it with '-sizes'
+default_sizes = [1000, 10000, 100000]
+
+# length of chains in 'deep' lists
+#	about as deep as still fits in an 80 column terminal
+deep_depth = 12
+
+# deepest level in 'realistic' lists
+realistic_depth = 6
+
+# words for task names
+vocabulary = ['email', 'call', 'buy', 'fix', 'read', 'write', 'book', 'pay',
+    'clean', 'plan', 'review', 'send', 'check', 'update', 'order', 'return',
+    'bike', 'car', 'report', 'taxes', 'milk', 'eggs', 'dentist', 'mom',
+    'meeting', 'slides', 'draft', 'invoice', 'garden', 'laundry', 'flights',
+    'hotel', 'notes', 'backup', 'bug', 'release', 'docs', 'friday', 'rent']
+
+
+# generate a to-do list of 'n' tasks with shape 'shape'
+#	wide		every task at the top level
+#	deep		chains of 'deep_depth' tasks, each the subtask of the last
+#	realistic	tasks under random others, a few levels deep, with names
+#			of varied length, some folded and some formatted
+# returns the to-do list
+def make_list(shape, n, seed=0):
+  rng = random.Random(seed)
+  formats = list(task_list.formats.values())
+  root = task('root')
+  tasks = [root]
+  depths = [0]
+
+  for i in range(n):
+    if shape == 'wide':
+      parent = 0
+    elif shape == 'deep':
+      parent = i if i % deep_depth else 0
+    else:
+      parent = rng.randrange(len(tasks)) if rng.random() < 0.8 else 0
+      while depths[parent] >= realistic_depth:
+        parent = rng.randrange(len(tasks))
+
+    words = rng.choices(vocabulary, k=rng.randint(1, 8))
+    t = task(' '.join(words)+f' #{i}')
+    if shape == 'realistic':
+      t.folded = rng.random() < 0.1
+      if rng.random() < 0.2:
+        t.format = rng.choice(formats)
+
+    p = tasks[parent]
+    if not p.subtasks: p.subtasks = []
+    p.subtasks.append(t)
+    tasks.append(t)
+    depths.append(depths[parent] + 1)
+
+  todo_list = task_list(root=root)
+  todo_list.update_IDs()
+  return todo_list
+
+
+# median time of 'reps' calls of 'run', calling 'after' (untimed) after each
+# returns seconds
+def timed(run, reps, after=None):
+  times = []
+  for _ in range(reps):
+    start = time.perf_counter()
+    run()
+    times.append(time.perf_counter() - start)
+    if after: after()
+  return statistics.median(times)
+
+
+# time each operation on a list of shape 'shape' with 'n' tasks
+# returns a dict of seconds per call by operation name
+def bench_list(shape, n, reps, tmp_dir):
+  rng = random.Random(1)
+  todo_list = make_list(shape, n)
+  # changes are recorded for the write-ahead log as they would be in use
+  todo_list.pending = []
+  IDs = [t.ID_str for t in todo_list.root.descendants()]
+  # pick tasks from the unchanged list, putting it back after each change
+  #	(if it changed: e.g. folding a folded task doesn't)
+  pick = lambda: rng.choice(IDs)
+  depth = len(todo_list.undo_states)
+  def restore():
+    if len(todo_list.undo_states) > depth:
+      todo_list.undo()
+    todo_list.pending.clear()
+  results = {}
+
+  # warm the rendering cache, as the first listing after loading would
+  todo_list.ls(rows=0)
+
+  # each add is timed, then the undo that takes it away again
+  adds, undos = [], []
+  def add():
+    todo_list.add(' '.join(rng.choices(vocabulary, k=4)), sub=pick())
+  for _ in range(reps):
+    adds.append(timed(add, 1))
+    undos.append(timed(todo_list.undo, 1))
+    todo_list.pending.clear()
+  results['add'] = statistics.median(adds)
+  results['undo'] = statistics.median(undos)
+
+  results['remove'] = timed(lambda: todo_list.remove(pick()), reps,
+      after=restore)
+  def move():
+    try:
+      todo_list.move(pick(), into=pick())
+    except AssertionError:
+      # moving into its own subtask; nothing changed
+      pass
+  results['move'] = timed(move, reps, after=restore)
+  results['rename'] = timed(lambda: todo_list.rename(pick()+' renamed task'),
+      reps, after=restore)
+  results['fold'] = timed(lambda: todo_list.fold(pick()), reps, after=restore)
+  results['unfold'] = timed(lambda: todo_list.unfold(pick()), reps,
+      after=restore)
+  results['find'] = timed(lambda: todo_list.find(rng.choice(vocabulary)), reps)
+
+  # listing a page, and everything, with the cache warm
+  results['ls'] = timed(lambda: todo_list.ls(rows=50), reps)
+  results['ls_all'] = timed(lambda: todo_list.ls(rows=0), max(reps // 5, 1))
+  # wrapping a long name, with nothing cached
+  long_task = task(' '.join(rng.choices(vocabulary, k=60)))
+  results['label'] = timed(lambda: long_task.label(80), reps)
+
+  # saving and loading, and loading then listing as on startup
+  save_file = os.path.join(tmp_dir, f'{shape}_{n}.todo')
+  results['save_tasks'] = timed(lambda: save_tasks(todo_list, save_file),
+      max(reps // 5, 1))
+  results['load_tasks'] = timed(lambda: load_tasks(save_file), reps)
+  results['load_ls'] = timed(lambda: load_tasks(save_file).ls(rows=50), reps)
+
+  # appending the record of a removed task to the log
+  log = task_log(os.path.join(tmp_dir, f'{shape}_{n}_log'))
+  description, logs = todo_list.remove(pick())
+  restore()
+  results['append_log'] = timed(lambda: log.append(logs), reps)
+
+  return results
+
+
+# compare 'results' with 'baseline', both dicts of seconds by name
+# returns list of names that took more than 'threshold' times as long
+def compare(results, baseline, threshold):
+  slower = []
+  print(f'\n{"":40} {"baseline":>10} {"now":>10} {"ratio":>7}')
+  for name, seconds in results.items():
+    if name not in baseline:
+      continue
+    ratio = seconds / baseline[name] if baseline[name] else float('inf')
+    mark = ''
+    if ratio > threshold:
+      mark = '  slower'
+      slower.append(name)
+    print(f'{name:40} {baseline[name]*1e6:9.1f}u {seconds*1e6:9.1f}u '
+        f'{ratio:7.2f}{mark}')
+  return slower
+
+
+if __name__ == '__main__':
+  args = parse_args(sys.argv[1:])
+  sizes = [int(n) for n in args['sizes'].split(',')] \
+      if 'sizes' in args else default_sizes
+  run_shapes = args['shapes'].split(',') if 'shapes' in args else shapes
+  reps = int(args.get('reps', 20))
+  here = os.path.dirname(os.path.abspath(__file__))
+  out_file = args.get('out', os.path.join(here, 'bench_results.json'))
+  baseline_file = args.get('baseline', os.path.join(here, 'bench_baseline.json'))
+  threshold = float(args.get('threshold', 1.5))
+  for shape in run_shapes:
+    assert shape in shapes, f'shape "{shape}" not recognized'
+
+  # results are keyed 'shape/size/operation'
+  results = {}
+  with tempfile.TemporaryDirectory() as tmp_dir:
+    for shape in run_shapes:
+      for n in sizes:
+        start = time.perf_counter()
+        for name, seconds in bench_list(shape, n, reps, tmp_dir).items():
+          results[f'{shape}/{n}/{name}'] = seconds
+        print(f'{shape} {n}: {time.perf_counter() - start:.1f}s')
+
+  with open(out_file, 'w') as f:
+    json.dump({
+        'date'      : datetime.datetime.now().isoformat(timespec='seconds'),
+        'python'    : platform.python_version(),
+        'machine'   : platform.machine(),
+        'reps'      : reps,
+        'results'   : results
+        }, f, indent=2)
+  print(f'results written to {out_file}')
+
+  if os.path.abspath(baseline_file) != os.path.abspath(out_file) \
+      and os.path.isfile(baseline_file):
+    with open(baseline_file) as f:
+      baseline = json.load(f)['results']
+    slower = compare(results, baseline, threshold)
+    if slower:
+      print(f'\n{len(slower)} slower than {threshold}x baseline')
+      sys.exit(1)
@@ -3,9 +3,22 @@ import os
 import sys
 import pickle
 import readline
-from copy import deepcopy
+import fcntl
+import time
+import mmap
+import struct
+from array import array
 import datetime
 import json
+import re
+import csv
+import functools
+import itertools
+import heapq
+import threading
+import subprocess
+import concurrent.futures
+from contextlib import contextmanager
 
 
 ############################################################################
@@ -25,6 +38,22 @@ utilities
 task / task_list classes
   core of the code---basically what it sounds like, classes for
   task and task list objects
+
+outlines
+  reading and writing task trees as indented text, Markdown and JSON,
+  for 'import' and 'export'
+
+persistence
+  save file format, and write-ahead log of changes replayed on top of
+  the last saved snapshot
+
+task log
+  log of finished tasks, kept in monthly segments of columns, and
+  statistics of it for the 'stats' command
+
+named lists
+  going through several to-do lists at once, each in a process of its
+  own, for 'find' and 'stats' across lists
 """
 
 
@@ -62,6 +91,56 @@ def IDs_to_lists(ID_strs):
   return [ID_to_list(i) for i in ID_strs.split()]
 
 
+# adjust an ID list for removal of subtask 'index' from task 'parent'
+#	(IDs of later siblings and their descendants move up by one)
+def ID_after_pop(ID_list, parent, index):
+  n = len(parent)
+  if len(ID_list) > n and ID_list[:n] == parent and ID_list[n] > index:
+    return ID_list[:n] + [ID_list[n]-1] + ID_list[n+1:]
+  return ID_list
+
+
+# adjust an ID list for insertion of a subtask at 'index' in task 'parent'
+#	(IDs of that position and later move down by one)
+def ID_after_insert(ID_list, parent, index):
+  n = len(parent)
+  if len(ID_list) > n and ID_list[:n] == parent and ID_list[n] >= index:
+    return ID_list[:n] + [ID_list[n]+1] + ID_list[n+1:]
+  return ID_list
+
+
+# read a selector of tasks, as accepted by commands taking several IDs:
+#	an ID, with '*' for every subtask at a level, and optionally a
+#	range of subtasks at the last level, e.g. '2.*', '3.1-3.40', or
+#	'3.1-40' (the end may leave off the levels it shares with the start)
+# returns list of (first, last) indices by level, last None for no end
+def parse_selector(s):
+  start, dash, end = s.partition('-')
+  start = start.split('.')
+  try:
+    levels = [(0, None) if i == '*' else (int(i) - 1,)*2 for i in start]
+    if dash:
+      end = end.split('.')
+      assert len(end) <= len(start) and end[:-1] == start[-len(end):-1], \
+          f'range "{s}" should be within one task'
+      levels[-1] = (levels[-1][0], int(end[-1]) - 1)
+  except ValueError:
+    raise AssertionError(f'"{s}" not understood, try e.g. 1.4, 2.* or 3.1-3.40')
+  assert all(first >= 0 for first, last in levels), \
+      f'"{s}" not understood, IDs count from 1'
+  assert levels[-1][1] is None or levels[-1][1] >= levels[-1][0], \
+      f'range "{s}" should go from first to last'
+  return levels
+
+
+# number of days in an age such as '30d', '2w', '6m' or '1y' (days if
+#	no unit is given)
+def parse_days(s):
+  match = re.fullmatch(r'(\d+)([dwmy]?)', s)
+  assert match, f'age "{s}" not understood, try e.g. 30d, 2w, 6m or 1y'
+  return int(match[1]) * {'': 1, 'd': 1, 'w': 7, 'm': 30, 'y': 365}[match[2]]
+
+
 # split a string into ID list and name
 def parse_ID_name(s):
   ID_str = ''
@@ -76,135 +155,91 @@ def parse_ID_name(s):
   return ID_to_list(ID_str), name
 
 
-# append prefix to beginning of each line of text after the first
-def line_prefix(text, prefix):
-  # strip whitespace from both ends of text
-  text = text.strip()
-  # replace newlines with newline plus prefix
-  return text.replace('\n','\n'+prefix)
-
-
-# sub-utility for justify function below
-def chomp(line):
-  # make lists of characters appearing in box-drawing prefix and in ID
-  prefix_chars = ['\u2500','\u2502','\u2514','\u251C',' ']
-  ID_chars = ['.']+[str(i) for i in range(10)]
-
-  # chomp off box-drawing prefix
-  prefix = ''
-  while line and line[0] in prefix_chars:
-    prefix += line[0]
-    line = line[1:]
-  # chomp off format escape code if there is one
-  form = ''
-  if line[0] == '\033':
-    # escape code starts with '\033' and ends with 'm'
-    # check condition at the end of the loop
-    #	because we want to break after chomping the 'm'
-    while line:
-      c = line[0]
-      form += c
-      line = line[1:]
-      if c == 'm':
-        break
-  # chomp off ID string
-  ID_str = ''
-  while line and line[0] in ID_chars:
-    ID_str += line[0]
-    line = line[1:]
-  # strip format escape code off the end of string if there is one
-  # do this by just deleting everything after the next '\033'
-  if '\033' in line:
-    idx = line.find('\033')
-    line = line[:idx]
-  # strip whitespace (usually just a leading space)
-  name = line.strip()
-
-  return prefix, form, ID_str, name
-
-
-# fit to-do list to line_width nicely
-def justify(text, width=None):
-  # if width was not passed, get it dynamically
-  if not width:
-    try:
-      width = os.get_terminal_size().columns
-    except OSError:
-      # if no width supplied and can't detect it, jus' choose smth
-      width = 76
-
-  out = ''
-  lines = text.splitlines()
-  # process each line independently, except checking the next line
-  for i, line in enumerate(lines):
-    # if line is short enough, just throw it in
-    if len(line) <= width:
-      out += line + '\n'
-      continue
-    # if it needs to be broken, carry on
-
-    # split up prefix, ID string, and name
-    prefix, form, ID_str, name = chomp(line)
-
-    # janky check if the next line is a child of this line
-    # will affect one character 'blox' of newline_prefix below
-    blox = ' '	# default just a space
-    if i+1 < len(lines):
-      next_prefix, *_ = chomp(lines[i+1])
-      if len(next_prefix) > len(prefix):
-        # if it is a child, we need an extra box-drawing character
-        blox = '\u2502'
-
-    # determine prefix for lines after the first
-    newline_prefix = prefix.replace('\u251C','\u2502')
-    newline_prefix = newline_prefix.replace('\u2500',' ')
-    newline_prefix = newline_prefix.replace('\u2514',' ')
-    newline_prefix += blox + ' '*len(ID_str)
-
-    # if newline prefix is as long as the line, make a fuss
-    assert len(newline_prefix) < width, 'justify: Line too long to justify'
-
-    # add to out until 'name' is empty
-    # number of columns left for name text
-    cols = width - len(newline_prefix)
-    # first line
-    out += prefix + form + ID_str + ' ' +  name[:cols] + '\033[0m\n'
-    name = name[cols:]
-    # subsequent lines
-    while name:
-      out += newline_prefix + form + name[:cols] + '\033[0m\n'
-      name = name[cols:]
-
-  # strip whitespace and return
-  return out.strip()
+# size of the terminal, or None if not writing to a terminal
+#	COLUMNS and LINES in the environment take precedence, as with
+#	shutil.get_terminal_size (the daemon sets them for each client)
+def terminal_size():
+  try:
+    return os.terminal_size(
+        (int(os.environ['COLUMNS']), int(os.environ['LINES'])))
+  except (KeyError, ValueError):
+    pass
+  try:
+    return os.get_terminal_size()
+  except OSError:
+    return None
+
+
+# width of the terminal, or something reasonable if it can't be detected
+def terminal_width(width=None):
+  # if width was passed, use it
+  if width:
+    return width
+  size = terminal_size()
+  # if no width supplied and can't detect it, jus' choose smth
+  return size.columns if size else 76
+
+
+# number of rows to fill with the to-do list
+#	the terminal height less a few rows for the prompt and description,
+#	or None (no limit) if not writing to a terminal
+def terminal_rows(rows=None):
+  # if rows were passed, use them (0 for no limit)
+  if rows is not None:
+    return int(rows) or None
+  size = terminal_size()
+  return max(size.lines - 4, 2) if size else None
+
+
+# write to-do list to a new file, and make sure it's on disk
+def dump_tasks(todo_list, path):
+  with open(path, 'wb') as f:
+    write_tree(todo_list, f)
+    f.flush()
+    os.fsync(f.fileno())
 
 
 # save to-do list
+#	write to a temporary file and rename it over the old one, so that a
+#	crash part way through never leaves a half-written save file
 def save_tasks(todo_list, save_file):
-
-  with open(save_file, 'wb') as f:
-    pickle.dump(todo_list, f)
+  tmp_file = f'{save_file}.{os.getpid()}.tmp'
+  dump_tasks(todo_list, tmp_file)
+  todo_list.undo_states.save(save_file, todo_list.wal_seq)
+  os.replace(tmp_file, save_file)
 
 
 # load to-do list
 def load_tasks(path):
   # read from specified path
+  #	save files from previous versions are pickled task_lists
   if os.path.isfile(path):
     with open(path, 'rb') as f:
-      todo_list = pickle.load(f)
+      if f.read(len(tree_magic)) == tree_magic:
+        todo_list = read_tree(f, path)
+      else:
+        f.seek(0)
+        todo_list = pickle.load(f)
   # if file doesn't exist, offer to create it
   else:
-    print('Save file not found at '+save_filepath)
+    print('Save file not found at '+path)
     yn = input('Create it? [y/n] ')
     assert yn[0] in ['y','Y'], 'No save file found or created'
     # if asked to create it, make an empty to-do list and save it
     todo_list = task_list()
-    with open(path, 'xb') as f:
-      pickle.dump(todo_list, f)
+    save_tasks(todo_list, path)
 
+  # archived subtasks are kept next to the save file
+  todo_list.shard_dir = path+'.shards'
   return todo_list
 
 
+# words in a task name, as indexed and searched for by 'find'
+# returns a set of lowercase words
+def name_words(name):
+  return set(re.findall(r'\w+', name.lower()))
+
+
 # parse command-line arguments into a dict
 def parse_args(sysargs):
   args = {}
@@ -249,12 +284,130 @@ def parse_args(sysargs):
   return args
 
 
-# clear screen (without clearing scrollback buffer)
+# clear screen (and scrollback buffer, if asked)
+#	prints the escape codes 'clear' would, so it goes wherever stdout does
 def clear_screen(clear_buffer=True):
+  # cursor home, clear screen, and clear scrollback
   if clear_buffer:
-    os.system('clear')
+    print('\033[H\033[2J\033[3J', end='')
   else:
-    os.system('clear -x')
+    print('\033[H\033[2J', end='')
+
+
+# terminal screen for the editor loop, which remembers the frame (the
+#	lines of the to-do list) it last drew at the top, so drawing the
+#	next only rewrites the lines that changed
+#	stands in for stdout, counting the rows written below the frame:
+#	if they could have scrolled it up, or the terminal was resized, the
+#	next frame is drawn on a cleared screen
+class screen:
+  def __init__(self, stream):
+    self.stream = stream			# where output goes
+    self.frame = None				# lines last drawn, None to start afresh
+    self.size = None				# terminal size they were drawn at
+    self.below = 0				# rows written below them since
+
+  # count the rows that 's' takes up when written
+  #	escape codes are counted as if visible, so long lines may be
+  #	counted as more rows than they are, but never fewer
+  def count(self, s):
+    width = self.size.columns if self.size else 1
+    lines = s.split('\n')
+    self.below += len(lines) - 1
+    self.below += sum(max(len(line) - 1, 0) // width for line in lines)
+
+  # write 's', counting the rows it takes up
+  def write(self, s):
+    self.count(s)
+    return self.stream.write(s)
+
+  # count a line typed at the prompt, which the terminal echoes
+  def typed(self, line):
+    self.count(line+'\n')
+
+  # anything else is as for the stream
+  def __getattr__(self, attr):
+    return getattr(self.stream, attr)
+
+  # draw 'lines' at the top of the screen, clearing what's below them,
+  #	and leave the cursor on the row after them
+  def draw(self, lines, clear_buffer=True):
+    size = terminal_size()
+    out = []
+    # (a row is kept spare for a line typed where it isn't counted,
+    #	such as the new name asked for by 'rename')
+    if (self.frame is None or size != self.size
+        or len(self.frame) + self.below >= size.lines - 1):
+      old = []
+      out.append('\033[H\033[2J\033[3J' if clear_buffer else '\033[H\033[2J')
+    else:
+      old = self.frame
+
+    # a frame taller than the screen scrolls, so is written out plainly
+    if size is None or len(lines) >= size.lines:
+      out.append('\n'.join(lines)+'\n')
+      self.frame = None
+    else:
+      for row, line in enumerate(lines):
+        if row >= len(old) or line != old[row]:
+          # clear the row before writing, as clearing after a line that
+          #	fills it would take off its last character
+          out.append(f'\033[{row+1};1H\033[K{line}')
+      out.append(f'\033[{len(lines)+1};1H\033[J')
+      self.frame = lines
+
+    self.stream.write(''.join(out))
+    self.stream.flush()
+    self.size = size
+    self.below = 0
+
+
+# wall-clock time spent in each phase of a command, for '-timing'
+#	phases may nest; time in a nested phase isn't counted in the one
+#	around it, so the phases add up to the whole
+class phase_timer:
+  def __init__(self):
+    self.times = None			# seconds by phase, None when not timing
+    self.stack = []			# phases in progress, innermost last
+    self.mark = 0			# when the innermost phase last resumed
+    self.started = 0			# when timing started
+
+  # start timing
+  def start(self):
+    self.times = {}
+    self.stack = []
+    self.started = time.perf_counter()
+
+  # stop timing
+  # returns dict of seconds by phase, in the order they started, and
+  #	the total since 'start'
+  def stop(self):
+    times, self.times = self.times, None
+    return times, time.perf_counter() - self.started
+
+  # context in which time is counted toward phase 'name'
+  @contextmanager
+  def __call__(self, name):
+    if self.times is None:
+      yield
+      return
+    self.count(time.perf_counter())
+    self.stack.append(name)
+    try:
+      yield
+    finally:
+      self.count(time.perf_counter())
+      self.stack.pop()
+
+  # count time since 'mark' toward the innermost phase
+  def count(self, now):
+    if self.stack and self.times is not None:
+      name = self.stack[-1]
+      self.times[name] = self.times.get(name, 0) + now - self.mark
+    self.mark = now
+
+# the one timer, shared by tasker and todo
+timing = phase_timer()
 
 
 ############################################################################
@@ -264,20 +417,128 @@ def clear_screen(clear_buffer=True):
 ############################################################################
 
 
+# formatting strings in use, each kept once and referred to by its
+#	index here, so that tasks don't hold a copy each
+format_table = ['']
+format_codes = {'': 0}
+
+# index of formatting string 'form' in 'format_table', adding it if new
+def format_code(form):
+  code = format_codes.get(form)
+  if code is None:
+    code = format_codes[form] = len(format_table)
+    format_table.append(form)
+  return code
+
+
+# start dates in use, kept once each like formats
+#	dates are day numbers from datetime.date.toordinal, 0 if unknown
+day_numbers = {}
+
+# day number of ISO date string 'date', '' giving 0
+def day_number(date):
+  day = datetime.date.fromisoformat(date).toordinal() if date else 0
+  return day_numbers.setdefault(day, day)
+
+# day number of today
+def today():
+  day = datetime.date.today().toordinal()
+  return day_numbers.setdefault(day, day)
+
+
 class task:
+  # fixed attributes rather than a __dict__ each, to keep large lists small
+  __slots__ = ('name', 'parent', 'index', 'subtasks', 'folded', 'code',
+      'day', 'key', 'shard', 'cache', 'span')
+
   def __init__(self, name):
     self.name = name				# name / description of task
-    self.ID_str = ''				# ID string for printing
-    self.subtasks = []				# list of subtasks
+    self.parent = None				# task it's under, see 'ID_list'
+    self.index = 0				# position there
+    self.subtasks = ()				# subtasks, a list once there are any
     self.folded = False				# fold flag
-    self.format = ''			# formatting for print
-    self.start_date = datetime.date.today().isoformat()
+    self.code = 0				# formatting for print, see 'format'
+    self.day = today()				# see 'start_date'
+    self.key = 0				# given when added to a list, see 'task_by_key'
+    self.shard = None				# (name, count, names of shards under it) if
+						#	subtasks are archived
+    self.cache = None				# rendered lines, see 'rows'
+    self.span = None				# rendered lines with subtasks, see 'height'
+
+  # formatting string, kept as an index into 'format_table'
+  @property
+  def format(self):
+    return format_table[self.code]
+
+  @format.setter
+  def format(self, form):
+    self.code = format_code(form)
+
+  # ID of task, worked out from the tasks it's under rather than kept,
+  #	since it's as long as the task is deep (see 'update_IDs')
+  #	tasks taken out of the list still give the ID they had there
+  @property
+  def ID_list(self):
+    ID_list = []
+    t = self
+    while t.parent is not None:
+      ID_list.append(t.index)
+      t = t.parent
+    ID_list.reverse()
+    return ID_list
+
+  # ID string for printing
+  @property
+  def ID_str(self):
+    return ID_to_str(self.ID_list)
+
+  # start date as ISO string, kept as a day number
+  @property
+  def start_date(self):
+    return datetime.date.fromordinal(self.day).isoformat() if self.day else ''
+
+  @start_date.setter
+  def start_date(self, date):
+    self.day = day_number(date)
+
+  # pickle as a tuple, without rendered lines or the task it's under
+  #	formats are pickled as strings, since codes differ between processes
+  def __getstate__(self):
+    return (self.name, self.subtasks, self.folded, self.format, self.day,
+        self.key, self.shard)
+
+  # tasks pickled by previous versions have a dict, possibly missing
+  #	attributes that 'full_upgrade' fills in, or a tuple with the ID
+  #	string second
+  def __setstate__(self, state):
+    self.parent = None
+    self.index = 0
+    self.key = 0
+    self.shard = None
+    if isinstance(state, dict):
+      state.pop('cache', None)
+      state.pop('span', None)
+      state.pop('ID_str', None)
+      for attr, value in state.items():
+        setattr(self, attr, value)
+    else:
+      if isinstance(state[1], str):
+        # tuples from before keys have six items, and from before shards
+        #	seven
+        state = state[:1] + state[2:] + (0, None)[len(state) - 6:]
+      (self.name, self.subtasks, self.folded, self.format, self.day,
+          self.key, self.shard) = state
+      self.day = day_numbers.setdefault(self.day, self.day)
+    # subtasks are made before this is, so they're told here where they are
+    for index, sub in enumerate(getattr(self, 'subtasks', ())):
+      sub.parent = self
+      sub.index = index
+    self.cache = None
+    self.span = None
 
   # upgrade from previous versions
   def full_upgrade(self):
     # check if attributes exist, and create them if not
-    try: self.ID_str
-    except AttributeError: self.ID_str = ''
     try: self.folded
     except AttributeError: self.folded = False
     try: self.format
@@ -289,46 +550,169 @@ class task:
     for sub in self.subtasks:
       sub.full_upgrade()
 
-  # recursively update ID string of self and subtasks
-  def update_IDs(self, ID_list):
-    self.ID_str = ID_to_str(ID_list)
-    for index, sub in enumerate(self.subtasks):
-      sub.update_IDs(ID_list+[index])
+  # tell subtasks (and theirs) where they are, so their IDs come out
+  #	right, and forget the rendered lines of those whose IDs change
+  #	'moved' is whether own ID has changed, in which case all of theirs
+  #	have too
+  def update_IDs(self, moved=False):
+    stack = [(self, moved)]
+    while stack:
+      t, moved = stack.pop()
+      if moved:
+        t.cache = None
+        t.span = None
+      for index, sub in enumerate(t.subtasks):
+        stack.append((sub, moved or sub.parent is not t or sub.index != index))
+        sub.parent = t
+        sub.index = index
+
+  # produce the line(s) showing this task, wrapped to fit 'width'
+  #	'first' is the box-drawing prefix for the first line,
+  #	'rest' the one for any lines after it
+  # returns a list of lines
+  def label(self, width, first='', rest=''):
+    ID_str = self.ID_str
+    line = first+self.format+ID_str+' '+self.name+'\033[0m'
+    # if line is short enough, just throw it in
+    if len(first) + len(ID_str) + 1 + len(self.name) <= width:
+      return [line]
 
-  # recursively produce a pretty list of self and subtasks
-  # returns it as a string
-  def ls(self, autofold=False):
-    out = ''	# output to build up
+    # prefix for lines after the first continues the box-drawing,
+    #	with an extra line down to the subtasks if there are any
+    blox = '\u2502' if self.subtask_count() or self.shard else ' '
+    newline_prefix = rest + blox + ' '*len(ID_str)
+
+    # if newline prefix is as long as the line, make a fuss
+    assert len(newline_prefix) < width, 'Line too long to justify'
 
-    # add self
-    out += self.format+self.ID_str+' '+self.name+'\033[0m\n'
+    # number of columns left for name text
+    cols = width - len(newline_prefix)
+    name = self.name
+    lines = [first+self.format+ID_str+' '+name[:cols]+'\033[0m']
+    name = name[cols:]
+    while name:
+      lines.append(newline_prefix+self.format+name[:cols]+'\033[0m')
+      name = name[cols:]
+
+    return lines
 
-    # if folded, end here
-    if self.folded or autofold:
+  # lines showing this task, plus indication of hidden subtasks if 'fold'
+  #	remembered until the task is changed (see task_list.touch) or asked
+  #	for with a different width or position in the tree
+  # returns a list of lines
+  def rows(self, width, first, rest, fold):
+    key = (width, first, rest, fold)
+    if self.cache is None or self.cache[0] != key:
+      rows = self.label(width, first, rest)
       # add indication of hidden subtasks if there are any
-      if self.subtasks:
-        out += '\u2514\u2500 ...\n'
-      return out
-
-    # add sub to-do lists with box-drawing indentation
-    for i, sub in enumerate(self.subtasks):
-      # treats last subtask differently for box-drawing
-      if i < len(self.subtasks) - 1:
-        out += '\u251C\u2500'
-        out += line_prefix(sub.ls(), '\u2502 ')
-        out += '\n'
+      #	and of archived ones, which are always hidden
+      if self.shard:
+        rows.append(rest+f'\u2514\u2500 ... {self.shard[1]} archived')
+      elif fold and self.subtask_count():
+        rows.append(rest+'\u2514\u2500 ...')
+      self.cache = (key, rows)
+
+    return self.cache[1]
+
+  # number of subtasks
+  def subtask_count(self):
+    return len(self.subtasks)
+
+  # subtask 'index', without making the others if they're still in the
+  #	save file (see stored_task)
+  def subtask(self, index):
+    return self.subtasks[index]
+
+  # subtasks with the box-drawing prefixes they are printed with, one at
+  #	a time, so that only those that get printed are made (see
+  #	stored_task)
+  #	treats last subtask differently for box-drawing
+  # yields (subtask, first-line prefix, later-line prefix)
+  def children(self, rest, subtasks=None):
+    if subtasks is None:
+      subtasks = self.subtasks
+    if not len(subtasks):
+      return
+    first, later = rest+'\u251C\u2500', rest+'\u2502 '
+    for index in range(len(subtasks) - 1):
+      yield subtasks[index], first, later
+    yield subtasks[-1], rest+'\u2514\u2500', rest+'  '
+
+  # number of lines in the pretty list of self and subtasks
+  #	worked out from name lengths without rendering anything, and
+  #	remembered until the task or a subtask is changed
+  # returns an int
+  def height(self, width, first, rest, fold):
+    key = (width, first, rest, fold)
+    if self.span is None or self.span[0] != key:
+      # lines for own name, same as in 'label'
+      ID_length = len(self.ID_str)
+      if len(first) + ID_length + 1 + len(self.name) <= width:
+        h = 1
       else:
-        out += '\u2514\u2500'
-        out += line_prefix(sub.ls(), '  ')
-        out += '\n'
-
-    return out
+        cols = max(width - len(rest) - 1 - ID_length, 1)
+        h = -(-len(self.name) // cols)
+
+      if self.shard:
+        h += 1
+      elif self.subtask_count():
+        if fold:
+          h += 1
+        else:
+          for sub, sub_first, sub_rest in self.children(rest):
+            h += sub.height(width, sub_first, sub_rest, sub.folded)
+      self.span = (key, h)
+
+    return self.span[1]
+
+  # produce a pretty list of self and subtasks, one line at a time
+  #	walks the tree once, passing box-drawing prefixes down as it goes
+  #	the first 'skip' lines are left out, and subtasks that fall
+  #	entirely within them are not rendered at all
+  # yields lines as strings
+  def lines(self, width, autofold=False, skip=0):
+    # iterators over the tasks still to print at each level, with their
+    #	prefixes
+    stack = [iter([(self, '', '')])]
+    while stack:
+      item = next(stack[-1], None)
+      if item is None:
+        stack.pop()
+        continue
+      t, first, rest = item
+      fold = t.folded or (autofold and t is self)
+
+      # jump over whole subtree if it's all skipped
+      if skip:
+        h = t.height(width, first, rest, fold)
+        if h <= skip:
+          skip -= h
+          continue
+
+      # add task itself
+      #	if folded, with indication of hidden subtasks, and go no further
+      rows = t.rows(width, first, rest, fold)
+      if skip:
+        rows, skip = rows[skip:], max(skip - len(rows), 0)
+      yield from rows
+      if fold or not t.subtask_count():
+        continue
+
+      # add subtasks with box-drawing indentation, first one on top
+      stack.append(t.children(rest))
+
+  # pretty list of self and subtasks
+  # returns it as a string
+  def ls(self, autofold=False, width=None):
+    return '\n'.join(self.lines(terminal_width(width), autofold))
 
-  # recursively unfold all tasks at all levels
-  def recursively_unfold(self):
-    self.folded = False
-    for t in self.subtasks:
-      t.recursively_unfold()
+  # iterate over all tasks at all levels below self (not including self)
+  def descendants(self):
+    stack = list(reversed(self.subtasks))
+    while stack:
+      t = stack.pop()
+      yield t
+      stack.extend(reversed(t.subtasks))
 
   # produce dict with log information
   def log(self):
@@ -341,23 +725,374 @@ class task:
         }
     return log
 
+  # produce dict with self and subtasks, e.g. for the write-ahead log
+  def to_dict(self):
+    return {
+        'name'        : self.name,
+        'format'      : self.format,
+        'folded'      : self.folded,
+        'start_date'  : self.start_date,
+        'key'         : self.key,
+        'shard'       : self.shard,
+        'subtasks'    : [sub.to_dict() for sub in self.subtasks]
+        }
+
+  # make task and subtasks from dict produced by to_dict
+  @classmethod
+  def from_dict(cls, d):
+    t = cls(d['name'])
+    t.format = d['format']
+    t.folded = d['folded']
+    t.start_date = d['start_date']
+    t.key = d.get('key', 0)
+    t.shard = tuple(d['shard']) if d.get('shard') else None
+    t.subtasks = [cls.from_dict(sub) for sub in d['subtasks']] or ()
+    return t
+
+
+
+# wrap a task_list command so that everything it changes is one undo step
+def undoable(method):
+  @functools.wraps(method)
+  def wrapper(self, *args, **kwargs):
+    with self.undo_step():
+      return method(self, *args, **kwargs)
+  return wrapper
+
+
+
+# index from words to the tasks with them in their names, for 'find'
+#	tasks from the save file are listed by position there (see
+#	tree_file.words), and only become objects when found; tasks added or
+#	renamed since are listed in 'live', and taken out of it again when
+#	removed, renamed or archived; the save file's part can't change, so
+#	what's found there is checked against the list instead
+class search_index:
+  def __init__(self, store=None):
+    self.store = store			# save file the index was saved with, if any
+    self.live = {}			# word -> set of tasks indexed since
+
+  # index tasks in iterable 'tasks'
+  def add(self, tasks):
+    for t in tasks:
+      for word in name_words(t.name):
+        self.live.setdefault(word, set()).add(t)
+
+  # take tasks in iterable 'tasks' out of 'live', by their current names
+  def remove(self, tasks):
+    if not self.live:
+      return
+    for t in tasks:
+      for word in name_words(t.name):
+        found = self.live.get(word)
+        if found is not None:
+          found.discard(t)
+          if not found:
+            del self.live[word]
+
+  # tasks which had all of 'words' in their names when indexed
+  # returns a set of tasks
+  def candidates(self, words):
+    found = set.intersection(*(self.live.get(word, set()) for word in words))
+    if self.store is not None:
+      saved = functools.reduce(
+          lambda a, b: a.intersection(b),
+          (self.store.words(word) for word in words))
+      found.update(self.store.task(i) for i in saved)
+      found.discard(None)
+    return found
+
+
+
+# undo steps of a to-do list, oldest first (see task_list.undo_step)
+#	steps saved with the list are kept in a file of their own next to
+#	the save file ('<save file>.undo'), and only read when undoing gets
+#	down to them, so loading and saving the list doesn't involve them;
+#	steps made since are kept in memory, and appended to the file when
+#	the list is next saved
+#	'<save file>.undo.index' says where in the file the saved steps are,
+#	for each of the last few saves (by write-ahead log record), so a
+#	save file that didn't get replaced still finds its steps
+class undo_history:
+  kept_saves = 3			# saves the index keeps steps for
+
+  def __init__(self, steps=None):
+    self.fd = None			# undo file as it was when loaded, if any
+    self.stored = []			# (offset, length) of saved steps in it
+    self.steps = list(steps or [])	# steps made since
+
+  # saves listed in the index next to 'save_file', oldest first, each as
+  #	a dict of 'seq' and 'steps'; none if it's missing or unreadable
+  #	(an index from before several saves were kept lists just one)
+  @staticmethod
+  def saves(save_file):
+    try:
+      with open(save_file+'.undo.index') as f:
+        index = json.load(f)
+    except (FileNotFoundError, ValueError):
+      return []
+    return index['saves'] if 'saves' in index else [index]
+
+  # steps saved with the list in 'save_file', as of write-ahead log
+  #	record 'seq'; none if they're missing or from another save
+  # returns undo history
+  @classmethod
+  def load(cls, save_file, seq):
+    history = cls()
+    for save in cls.saves(save_file):
+      if save['seq'] != seq:
+        continue
+      try:
+        history.fd = os.open(save_file+'.undo', os.O_RDONLY)
+      except FileNotFoundError:
+        break
+      history.stored = [tuple(step) for step in save['steps']]
+      break
+    return history
+
+  def __len__(self):
+    return len(self.stored) + len(self.steps)
+
+  def append(self, step):
+    self.steps.append(step)
+
+  # take off the most recent step, reading it from the file if need be
+  # returns the step
+  def pop(self):
+    if self.steps:
+      return self.steps.pop()
+    offset, length = self.stored.pop()
+    return pickle.loads(os.pread(self.fd, length, offset))
+
+  # forget the oldest steps, leaving at most 'depth'
+  def trim(self, depth):
+    extra = len(self) - depth
+    if extra > 0:
+      dropped = min(extra, len(self.stored))
+      del self.stored[:dropped]
+      del self.steps[:extra - dropped]
+
+  # all steps, oldest first, reading any saved ones
+  def all_steps(self):
+    return [pickle.loads(os.pread(self.fd, length, offset))
+        for offset, length in self.stored] + self.steps
+
+  # pickle (and copy) with every step in memory
+  def __getstate__(self):
+    return (self.all_steps(),)
+
+  def __setstate__(self, state):
+    self.__init__(state[0])
+
+  # write the steps for the list being saved to 'save_file', as of
+  #	write-ahead log record 'seq'
+  #	new steps are appended to the file, if it's the one the saved
+  #	steps are in; otherwise, or if most of the file is steps no longer
+  #	needed, it's written afresh, with the steps of the earlier saves
+  #	still listed in the index
+  #	with 'rebase', carry on from the file as written, so the next save
+  #	only has the steps made after this one to add
+  def save(self, save_file, seq, rebase=False):
+    path = save_file+'.undo'
+    blobs = [pickle.dumps(step) for step in self.steps]
+    try:
+      ino = os.stat(path).st_ino
+      size = os.path.getsize(path)
+    except FileNotFoundError:
+      ino = size = None
+    live = sum(length for _, length in self.stored) + sum(map(len, blobs))
+    earlier = []
+    if ino is not None:
+      earlier = [save for save in self.saves(save_file)
+          if save['seq'] != seq][1-self.kept_saves:]
+
+    if (self.fd is not None and ino == os.fstat(self.fd).st_ino
+        and size <= 2 * live):
+      stored = list(self.stored)
+      with open(path, 'ab') as f:
+        offset = f.tell()
+        for blob in blobs:
+          stored.append((offset, len(blob)))
+          offset += len(blob)
+        f.write(b''.join(blobs))
+        f.flush()
+        os.fsync(f.fileno())
+    else:
+      out = bytearray()
+      copied = {}
+      # copy steps at (offset, length) 'spans' of open file 'fd' to 'out',
+      #	once each however many saves have them
+      # returns where they are in 'out'
+      def copy(fd, spans):
+        ino = os.fstat(fd).st_ino
+        moved = []
+        for offset, length in spans:
+          key = (ino, offset, length)
+          if key not in copied:
+            copied[key] = len(out)
+            out.extend(os.pread(fd, length, offset))
+          moved.append((copied[key], length))
+        return moved
+      if earlier:
+        fd = os.open(path, os.O_RDONLY)
+        try:
+          earlier = [{'seq': save['seq'], 'steps': copy(fd, save['steps'])}
+              for save in earlier]
+        finally:
+          os.close(fd)
+      stored = copy(self.fd, self.stored) if self.stored else []
+      for blob in blobs:
+        stored.append((len(out), len(blob)))
+        out.extend(blob)
+      tmp_file = f'{path}.{os.getpid()}.tmp'
+      with open(tmp_file, 'wb') as f:
+        f.write(out)
+        f.flush()
+        os.fsync(f.fileno())
+      os.replace(tmp_file, path)
+
+    tmp_file = f'{path}.index.{os.getpid()}.tmp'
+    with open(tmp_file, 'w') as f:
+      json.dump({'saves': earlier + [{'seq': seq, 'steps': stored}]}, f)
+    os.replace(tmp_file, path+'.index')
+
+    if rebase:
+      fd = os.open(path, os.O_RDONLY)
+      if self.fd is not None:
+        os.close(self.fd)
+      self.fd, self.stored, self.steps = fd, stored, []
+
 
 
 class task_list:
-  def __init__(self, root=None, focus=[], focus_past=[],
-      undo_states=[], max_undo_depth=10):
+  def __init__(self, root=None, focus=None, focus_past=None,
+      undo_states=None, max_undo_depth=1000):
     if root == None: self.root = task(name='root')
     else:	self.root = root
-    self.focus = focus
-    self.focus_past = focus_past
-    self.undo_states = undo_states
+    self.next_key = 1			# key for the next new task
+    self.keys = None			# index of tasks by key, made when needed
+    self.key_tasks(self.root.descendants())
+    # focus and past focuses are kept by key, see 'focus'
+    self.focus_key = self.key_at(focus or [])
+    self.focus_past_keys = [self.key_at(f) for f in focus_past or []]
+    self.focus_hint = []		# ID of focus when last looked up
+    self.shard_dir = None		# where archived subtasks go, see 'shard_file'
+    # each undo state is a list of inverse operations (see 'revert')
+    self.undo_states = undo_history(undo_states)
     self.max_undo_depth = max_undo_depth
+    self.wal_seq = 0			# last write-ahead log record applied
+    self.step = None			# undo step being recorded, if any
+    self.pending = None			# changes not yet in write-ahead log
+    self.search = None			# index for 'find', made when needed
+
+  # don't pickle the undo step in progress, uncommitted changes or indexes
+  #	(undo history is pickled with all its steps, but left out of save
+  #	files, see 'write_tree')
+  def __getstate__(self):
+    state = self.__dict__.copy()
+    state.pop('step', None)
+    state.pop('pending', None)
+    state.pop('search', None)
+    state.pop('keys', None)
+    return state
+
+  def __setstate__(self, state):
+    self.__dict__.update(state)
+    self.__dict__.setdefault('wal_seq', 0)
+    self.__dict__.setdefault('shard_dir', None)
+    self.step = None
+    self.pending = None
+    self.search = None
+    self.keys = None
+    # undo history is a list in lists pickled by previous versions, and
+    #	missing from save files, which 'load_tasks' then reads it for
+    undo_states = state.get('undo_states')
+    if not isinstance(undo_states, undo_history):
+      self.undo_states = undo_history(undo_states)
+    # lists saved before tasks had keys get them now, in list order,
+    #	which comes out the same in every process loading the same file
+    if 'next_key' not in state:
+      self.next_key = 1
+      self.key_tasks(self.root.descendants())
+    # and their focus is kept by key from now on
+    if 'focus' in state:
+      del self.__dict__['focus']
+      self.focus_key = self.key_at(state['focus'])
+      self.focus_past_keys = [self.key_at(f)
+          for f in self.__dict__.pop('focus_past', [])]
+      self.focus_hint = []
+
+  # ID list of the focus task, [] if there's none
+  #	the focus is kept by key, so it stays on the same task when tasks
+  #	are moved or removed around it; if it's removed itself, there's no
+  #	focus unless it comes back
+  @property
+  def focus(self):
+    t = self.task_by_key(self.focus_key, self.focus_hint)
+    if t is None:
+      return []
+    self.focus_hint = ID_to_list(t.ID_str)
+    return ID_to_list(t.ID_str)
+
+  # ID lists of past focus tasks, oldest first, leaving out removed ones
+  @property
+  def focus_past(self):
+    tasks = (self.task_by_key(key) for key in self.focus_past_keys)
+    return [ID_to_list(t.ID_str) for t in tasks if t is not None]
+
+  # task with key 'key' (the root has key 0), or None if it's not in the
+  #	list; 'hint' is an ID list to check first
+  #	the index from keys to tasks is made on the first lookup the hint
+  #	doesn't answer, and kept up to date by 'insert_task' from then on;
+  #	tasks taken out of the list are left in it, and found to be gone
+  #	because they're no longer at their IDs
+  def task_by_key(self, key, hint=None):
+    if not key:
+      return self.root
+    if hint:
+      try:
+        t = self.grab_task(hint)
+        if t.key == key:
+          return t
+      except IndexError:
+        pass
+    if self.keys is None:
+      self.keys = {t.key: t for t in self.root.descendants()}
+    t = self.keys.get(key)
+    if t is None:
+      return None
+    try:
+      if self.grab_task(ID_to_list(t.ID_str)) is t:
+        return t
+    except IndexError:
+      pass
+    return None
+
+  # key of the task at ID list 'ID_list', 0 (as for the root) if there's
+  #	no task there
+  def key_at(self, ID_list):
+    try:
+      return self.grab_task(ID_list).key
+    except IndexError:
+      return 0
+
+  # give keys to tasks in 'tasks' that don't have one, and add them all
+  #	to the index of keys, if it's been made
+  #	tasks from other processes (through the write-ahead log) come with
+  #	keys, which the next new key has to stay clear of
+  def key_tasks(self, tasks):
+    for t in tasks:
+      if not t.key:
+        t.key = self.next_key
+      self.next_key = max(self.next_key, t.key + 1)
+      if self.keys is not None:
+        self.keys[t.key] = t
 
   # find and return task for given ID list
   def grab_task(self, ID_list):
     t = self.root
     for index in ID_list:
-      t = t.subtasks[index]
+      t = t.subtask(index)
     return t
 
   # find and return task for given ID list
@@ -372,14 +1107,14 @@ class task_list:
   # upgrade from previous version
   def full_upgrade(self):
     # check if attributes exist, and if not create them
-    try: self.focus
-    except AttributeError: self.focus = []
-    try: self.focus_past
-    except AttributeError: self.focus_past = []
+    try: self.focus_key
+    except AttributeError: self.focus_key = 0
+    try: self.focus_past_keys
+    except AttributeError: self.focus_past_keys = []
     try: self.undo_states
-    except AttributeError: self.undo_states = []
+    except AttributeError: self.undo_states = undo_history()
     try: self.max_undo_depth
-    except AttributeError: self.max_undo_depth = 10
+    except AttributeError: self.max_undo_depth = 1000
 
     # send it down to the task tree
     self.root.full_upgrade()
@@ -387,32 +1122,518 @@ class task_list:
   # update ID strings in tasks
   # no return value
   def update_IDs(self):
-    self.root.update_IDs([])
+    self.root.update_IDs()
 
-  # pretty-print task list
-  # returns output as string
-  def ls(self, sub=''):
+  # mark a task and the tasks above it as needing to be rendered again
+  # no return value
+  def touch(self, ID_list):
+    t = self.root
+    t.cache = t.span = None
+    for index in ID_list:
+      t = t.subtasks[index]
+      t.cache = t.span = None
+
+  # tell subtasks of 'p' from 'start' on where they are, after subtasks
+  #	are added to or removed from 'p' at 'start'
+  #	only the subtasks that have moved, and the tasks under them, are
+  #	gone through (see task.update_IDs)
+  # no return value
+  def renumber(self, p, start=0):
+    for index in range(start, len(p.subtasks)):
+      sub = p.subtasks[index]
+      if sub.parent is not p or sub.index != index:
+        sub.parent = p
+        sub.index = index
+        sub.update_IDs(moved=True)
+
+  #
+  #	primitive changes to the task tree
+  #
+  #	every change to the tree or focus goes through one of these, and
+  #	each one records the operation that reverses it in the undo step
+  #	being recorded (see 'undo_step'), if there is one
+  #
+
+  # record an inverse operation in the current undo step
+  def journal(self, op):
+    if self.step is not None:
+      self.step.append(op)
+
+  # record a forward operation for the write-ahead log, if it's attached
+  def emit(self, op):
+    if self.pending is not None:
+      self.pending.append(op)
+
+  # task at 'ID_list', with its archived subtasks brought back if it's a
+  #	stub, so that tasks put under it go in with them
+  # returns the task
+  def open_stub(self, ID_list):
+    t = self.grab_task(ID_list)
+    if t.shard:
+      self.unarchive_task(ID_list)
+    return t
+
+  # insert task 't' as a subtask of 'parent' at 'index' (None for the end)
+  # returns the index it ended up at
+  def insert_task(self, parent, index, t):
+    p = self.open_stub(parent)
+    # normalize index the same way list.insert does
+    n = len(p.subtasks)
+    if index is None: index = n
+    elif index < 0: index = max(index + n, 0)
+    else: index = min(index, n)
+
+    if not p.subtasks: p.subtasks = []
+    p.subtasks.insert(index, t)
+    self.renumber(p, index)
+    self.touch(parent)
+    tasks = [t, *t.descendants()]
+    self.key_tasks(tasks)
+    if self.search is not None:
+      self.search.add(tasks)
+    self.journal(('pop', parent, index))
+    self.emit(['insert', parent, index, t.to_dict()])
+    return index
+
+  # remove and return subtask at 'index' of 'parent'
+  def pop_task(self, parent, index):
+    p = self.grab_task(parent)
+    t = p.subtasks.pop(index)
+    self.renumber(p, index)
+    self.touch(parent)
+    if self.search is not None:
+      self.search.remove([t, *t.descendants()])
+    self.journal(('insert', parent, index, t))
+    self.emit(['pop', parent, index])
+    return t
+
+  # remove subtasks at 'indices' of 'parent' all at once
+  #	(renumbering once, rather than after each as 'pop_task' would)
+  # returns list of removed tasks, in order
+  def pop_tasks(self, parent, indices):
+    p = self.grab_task(parent)
+    indices = sorted(set(indices))
+    popped = set(indices)
+    removed = [p.subtasks[index] for index in indices]
+    p.subtasks = [t for index, t in enumerate(p.subtasks)
+        if index not in popped]
+    self.renumber(p, indices[0])
+    self.touch(parent)
+    if self.search is not None:
+      self.search.remove(sub for t in removed for sub in [t, *t.descendants()])
+    self.journal(('inserts', parent, list(zip(indices, removed))))
+    self.emit(['pops', parent, indices])
+    return removed
+
+  # insert tasks at indices of 'parent', given as (index, task) pairs
+  #	in order, where each index is where the task ends up
+  #	(the reverse of 'pop_tasks')
+  def insert_tasks(self, parent, items):
+    p = self.open_stub(parent)
+    if not p.subtasks: p.subtasks = []
+    for index, t in items:
+      p.subtasks.insert(index, t)
+    self.renumber(p, items[0][0])
+    self.touch(parent)
+    tasks = [sub for index, t in items for sub in [t, *t.descendants()]]
+    self.key_tasks(tasks)
+    if self.search is not None:
+      self.search.add(tasks)
+    self.journal(('pops', parent, [index for index, t in items]))
+    self.emit(['inserts', parent,
+        [[index, t.to_dict()] for index, t in items]])
+
+  # move subtask 'index' of 'parent' to 'new_index' of 'new_parent'
+  #	'new_parent' is given by its ID before the move
+  # returns the moved task
+  def move_task(self, parent, index, new_parent, new_index=None):
+    assert new_parent[:len(parent)+1] != parent+[index], \
+        "can't move a task into its own subtask"
+    # grab new parent first so IDs are not disturbed
+    p = self.open_stub(new_parent)
+    old_p = self.grab_task(parent)
+    t = old_p.subtasks.pop(index)
+
+    n = len(p.subtasks)
+    if new_index is None: new_index = n
+    elif new_index < 0: new_index = max(new_index + n, 0)
+    else: new_index = min(new_index, n)
+    if not p.subtasks: p.subtasks = []
+    p.subtasks.insert(new_index, t)
+
+    # renumber old parent first, in case that changes the new parent's ID
+    #	(if instead the old parent's ID changes, the second pass fixes it)
+    if old_p is p:
+      self.renumber(p, min(index, new_index))
+    else:
+      self.renumber(old_p, index)
+      self.renumber(p, new_index)
+    self.emit(['move', parent, index, new_parent, new_index])
+
+    # record where things are now, for moving back
+    new_parent = ID_after_pop(new_parent, parent, index)
+    parent = ID_after_insert(parent, new_parent, new_index)
+    self.touch(parent)
+    self.touch(new_parent)
+    self.journal(('move', new_parent, new_index, parent, index))
+    return t
+
+  # file holding archived subtasks 'shard' (see 'archive_task')
+  def shard_file(self, shard):
+    assert self.shard_dir, 'archiving needs a save file to archive next to'
+    return os.path.join(self.shard_dir, shard)
+
+  # move subtasks of task at 'ID_list' into shard 'shard', leaving the
+  #	task as a stub which counts them, archived ones under them included,
+  #	and names the shards of those (see 'shards_in')
+  #	the shard is written unless it's there already, as it is when
+  #	replaying a change another process made, or undoing an unarchive
+  #	(shards never change once written, see 'archive')
+  def archive_task(self, ID_list, shard):
+    t = self.grab_task(ID_list)
+    assert not t.shard, f'{t.ID_str} is archived already'
+    path = self.shard_file(shard)
+    if not os.path.exists(path):
+      os.makedirs(self.shard_dir, exist_ok=True)
+      tmp_file = f'{path}.{os.getpid()}.tmp'
+      with open(tmp_file, 'wb') as f:
+        pickle.dump(list(t.subtasks), f)
+        f.flush()
+        os.fsync(f.fileno())
+      os.replace(tmp_file, path)
+    t.shard = (shard,
+        sum(1 + (sub.shard[1] if sub.shard else 0) for sub in t.descendants()),
+        tuple(sorted(shards_in(list(t.subtasks)))))
+    if self.search is not None:
+      self.search.remove(t.descendants())
+    t.subtasks = ()
+    self.touch(ID_list)
+    self.journal(('unarchive', ID_list))
+    self.emit(['archive', ID_list, shard])
+
+  # bring back the subtasks of stub task at 'ID_list' from its shard
+  #	(ahead of any it has, though tasks put under a stub bring it back
+  #	first, see 'open_stub')
+  def unarchive_task(self, ID_list):
+    t = self.grab_task(ID_list)
+    shard = t.shard[0]
+    path = self.shard_file(shard)
+    assert os.path.isfile(path), \
+        f'archived subtasks of {t.ID_str} not found at {path}'
+    with open(path, 'rb') as f:
+      t.subtasks = list(pickle.load(f)) + list(t.subtasks)
+    t.shard = None
+    t.update_IDs()
+    tasks = list(t.descendants())
+    self.key_tasks(tasks)
+    if self.search is not None:
+      self.search.add(tasks)
+    self.touch(ID_list)
+    self.journal(('archive', ID_list, shard))
+    self.emit(['unarchive', ID_list])
+
+  # set attribute 'attr' (name, format, folded, ...) of a task
+  def set_attr(self, ID_list, attr, value):
+    t = self.grab_task(ID_list)
+    old = getattr(t, attr)
+    if old == value:
+      return
+    if attr == 'name' and self.search is not None:
+      self.search.remove([t])
+    setattr(t, attr, value)
+    self.touch(ID_list)
+    if attr == 'name' and self.search is not None:
+      self.search.add([t])
+    self.journal(('set', ID_list, attr, old))
+    self.emit(['set', ID_list, attr, value])
+
+  # set focus and past focus, given by key (see 'focus')
+  #	operations recorded by previous versions give them as ID lists
+  def set_focus_state(self, focus, focus_past):
+    if isinstance(focus, list):
+      focus = self.key_at(focus)
+    focus_past = [self.key_at(f) if isinstance(f, list) else f
+        for f in focus_past]
+    self.journal(('focus', self.focus_key, self.focus_past_keys))
+    self.emit(['focus', focus, focus_past])
+    self.focus_key = focus
+    self.focus_past_keys = focus_past
+
+  # apply one inverse operation from the journal
+  def revert(self, op):
+    kind, *args = op
+    if kind == 'insert': self.insert_task(*args)
+    elif kind == 'pop': self.pop_task(*args)
+    elif kind == 'inserts': self.insert_tasks(*args)
+    elif kind == 'pops': self.pop_tasks(*args)
+    elif kind == 'move': self.move_task(*args)
+    elif kind == 'set': self.set_attr(*args)
+    elif kind == 'focus': self.set_focus_state(*args)
+    elif kind == 'archive': self.archive_task(*args)
+    elif kind == 'unarchive': self.unarchive_task(*args)
+    else:
+      assert False, f"unknown undo operation '{kind}'"
+
+  # apply a list of inverse operations, last first, without recording them
+  def unwind(self, ops):
+    step, self.step = self.step, None
+    pending, self.pending = self.pending, None
+    try:
+      for op in reversed(ops):
+        self.revert(op)
+    finally:
+      self.step = step
+      self.pending = pending
+
+  # apply one forward operation from the write-ahead log
+  def redo(self, op):
+    kind, *args = op
+    if kind == 'insert':
+      parent, index, d = args
+      self.insert_task(parent, index, task.from_dict(d))
+    elif kind == 'pop': self.pop_task(*args)
+    elif kind == 'inserts':
+      parent, items = args
+      self.insert_tasks(parent,
+          [(index, task.from_dict(d)) for index, d in items])
+    elif kind == 'pops': self.pop_tasks(*args)
+    elif kind == 'move': self.move_task(*args)
+    elif kind == 'set': self.set_attr(*args)
+    elif kind == 'focus': self.set_focus_state(*args)
+    elif kind == 'archive': self.archive_task(*args)
+    elif kind == 'unarchive': self.unarchive_task(*args)
+    elif kind == 'undo': self.undo()
+    else:
+      assert False, f"unknown write-ahead log operation '{kind}'"
+
+  # apply a list of forward operations as one undo step
+  def replay(self, ops):
+    with self.undo_step():
+      for op in ops:
+        self.redo(op)
+
+  # context in which all changes make up a single undo step
+  #	nested steps (e.g. open_task calling unfold and set_focus) are merged
+  #	into the outermost one; if an error escapes, the step is rolled back
+  @contextmanager
+  def undo_step(self):
+    if self.step is not None:
+      yield
+      return
+
+    self.step = []
+    mark = len(self.pending) if self.pending is not None else 0
+    try:
+      yield
+    except BaseException:
+      step, self.step = self.step, None
+      self.unwind(step)
+      # forget changes that were rolled back
+      if self.pending is not None:
+        del self.pending[mark:]
+      raise
+    step, self.step = self.step, None
+
+    # only keep steps which actually changed something
+    if step:
+      self.undo_states.append(step)
+      # trim down to max_undo_depth
+      self.undo_states.trim(self.max_undo_depth)
+
+  # tasks listed by default, with parent / focus if there is one
+  # returns an iterable of tasks, top-level ones made as they're reached
+  def listed(self, sub=''):
     # convert parent ID 'sub' to list form, or use focus if no parent
     if sub:
       parent = ID_to_list(sub)
     else:
       parent = self.focus
 
-    t_list = ''
     # if parent / focus is set, list that task
     if parent:
-      t_list = self.grab_task(parent).ls()
-    # if not, concatenate lists for each top-level task
+      return [self.grab_task(parent)]
+    # if not, list each top-level task in turn
     else:
-      for sub in self.root.subtasks:
-        t_list += sub.ls()
+      return (sub for sub, first, rest in self.root.children(''))
+
+  # pretty-print task list, one line at a time, leaving out 'skip' lines
+  # yields lines as strings
+  def lines(self, sub='', width=None, skip=0):
+    width = terminal_width(width)
+    for t in self.listed(sub):
+      # jump over top-level tasks that are skipped entirely
+      if skip:
+        h = t.height(width, '', '', t.folded)
+        if h <= skip:
+          skip -= h
+          continue
+      yield from t.lines(width, skip=skip)
+      skip = 0
+
+  # number of pages the task list takes up, with 'rows' lines per page
+  #	this works out the height of everything listed, so it's only for
+  #	when the number is asked for; 'ls' and 'has_page' don't need it
+  # returns an int
+  def pages(self, sub='', rows=None, width=None):
+    rows = terminal_rows(rows)
+    if not rows:
+      return 1
+    width = terminal_width(width)
+    total = sum(t.height(width, '', '', t.folded) for t in self.listed(sub))
+    # a page with more after it loses a line to say so
+    if total <= rows:
+      return 1
+    return -(-total // max(rows - 1, 1))
+
+  # whether there's anything on page 'page', with 'rows' lines per page
+  #	only what comes before the page is gone through
+  # returns a bool
+  def has_page(self, page, sub='', rows=None):
+    rows = terminal_rows(rows)
+    if page < 1 or (page > 1 and not rows):
+      return False
+    if page == 1:
+      return True
+    skip = (page-1)*max(rows - 1, 1)
+    return next(self.lines(sub, skip=skip), None) is not None
 
-    return justify(t_list)
+  # pretty-print task list
+  #	only renders what fits in 'rows' lines (default: terminal height),
+  #	starting from page 'page' (pages after the first skip what comes
+  #	before them without rendering it)
+  #	a line more than fits is rendered, to tell whether there's more
+  #	below, so a page costs the same however long the list is
+  # returns output as string
+  def ls(self, sub='', page=1, rows=None):
+    rows = terminal_rows(rows)
+    if not rows:
+      return '\n'.join(self.lines(sub))
+
+    # a page past the end shows the last one
+    page = max(int(page), 1)
+    if not self.has_page(page, sub, rows):
+      page = self.pages(sub, rows)
+    # each page but the last leaves a line to say there's more
+    size = max(rows - 1, 1)
+    out = list(itertools.islice(self.lines(sub, skip=(page-1)*size), rows+1))
+    if page == 1 and len(out) <= rows:
+      return '\n'.join(out)
+    if len(out) <= size:
+      return '\n'.join(out)
+    return '\n'.join(out[:size]+[f'\u2026 page {page}, more below'])
+
+  # open tasks with the earliest start dates, oldest first
+  #	tasks with unknown start dates are left out
+  # returns list of at most 'n' tasks
+  def oldest(self, n=10):
+    return heapq.nsmallest(n,
+        (t for t in self.root.descendants() if t.day), key=lambda t: t.day)
+
+  # tasks picked out by selectors in 'main' (see parse_selector) and
+  #	predicates: at depth 'depth' (1 for top-level), with format
+  #	'format', or started more than 'older' ago (see parse_days)
+  #	with no selectors, predicates pick from all tasks (under the focus
+  #	if there is one); with neither, nothing is picked
+  #	selectors only visit the tasks they name, and predicates the tasks
+  #	under the focus, each once
+  # returns sorted list of ID lists
+  def select(self, main='', depth=None, format=None, older=None):
+    # predicates, each a test of a task and its ID list
+    tests = []
+    if depth is not None:
+      depth = int(depth)
+      tests.append(lambda t, ID_list: len(ID_list) == depth)
+    if format is not None:
+      assert format in self.formats, 'format "'+format+'" not recognized\nknown formats: '+' '.join(self.formats.keys())
+      # tasks which were never formatted count as 'none'
+      forms = {self.formats[format]} | ({''} if format == 'none' else set())
+      tests.append(lambda t, ID_list: t.format in forms)
+    if older is not None:
+      before = today() - parse_days(older)
+      tests.append(lambda t, ID_list: 0 < t.day < before)
+
+    # candidates, by ID
+    found = {}
+    if main.split():
+      for selector in main.split():
+        levels = parse_selector(selector)
+        exact = all(first == last for first, last in levels)
+        # expand level by level, from the tasks found so far
+        frontier = [((), self.root)]
+        for first, last in levels:
+          if exact:
+            assert first < len(frontier[0][1].subtasks), \
+                f'no task {selector}'
+          frontier = [(ID + (index,), t.subtasks[index])
+              for ID, t in frontier
+              for index in range(first, len(t.subtasks) if last is None
+                  else min(last + 1, len(t.subtasks)))]
+        found.update(frontier)
+    elif tests:
+      stack = [(tuple(self.focus), self.grab_task(self.focus))]
+      while stack:
+        ID, t = stack.pop()
+        for index, sub in enumerate(t.subtasks):
+          found[ID + (index,)] = sub
+          stack.append((ID + (index,), sub))
+
+    return sorted(list(ID) for ID, t in found.items()
+        if all(test(t, ID) for test in tests))
+
+  # group ID lists by parent, leaving out any under another of them
+  #	(they go along with it when it's removed or moved)
+  # returns dict of lists of indices by parent ID (as a tuple), with the
+  #	last parent first, so taking subtasks out of each in turn doesn't
+  #	change the IDs of those to come
+  def by_parent(self, ID_lists):
+    groups = {}
+    outer = None
+    for ID_list in sorted(ID_lists):
+      if outer is not None and ID_list[:len(outer)] == outer:
+        continue
+      outer = ID_list
+      groups.setdefault(tuple(ID_list[:-1]), []).append(ID_list[-1])
+    return dict(sorted(groups.items(), reverse=True))
+
+  # find tasks with all the words of 'main' in their names
+  # returns string listing them, with the tasks they're under
+  def find(self, main):
+    words = name_words(main)
+    assert words, 'no words to find'
+    # lists without a saved index are indexed when first searched
+    if self.search is None:
+      self.search = search_index()
+      self.search.add(self.root.descendants())
+
+    found = []
+    for t in self.search.candidates(words):
+      # skip tasks renamed since being indexed
+      if not words <= name_words(t.name):
+        continue
+      # skip tasks removed since, which are no longer at their IDs
+      ID_list = ID_to_list(t.ID_str)
+      try:
+        if not ID_list or self.grab_task(ID_list) is not t:
+          continue
+      except IndexError:
+        continue
+      found.append(ID_list)
+
+    if not found:
+      return 'no tasks found'
+    out = []
+    for ID_list in sorted(found):
+      names = self.list_names(ID_list)
+      out.append(ID_to_str(ID_list)+' '+names[-1])
+      # path of tasks it's under
+      if len(names) > 1:
+        out.append('    in: '+' > '.join(names[:-1]))
+    return '\n'.join(out)
 
   # add a new task
   # returns string describing addition
+  @undoable
   def add(self, main, sub=None, top=False):
-    self.save_undo_state()
     # arg 'main' is name / description of task
     name = main
     # convert parent ID 'sub' to list form, or use focus if no parent
@@ -424,107 +1645,127 @@ class task_list:
     # make new task and add to parent
     #	at the top of the list if specified, otherwise at the bottom
     new_task = task(name)
-    if top:
-      self.grab_task(parent).subtasks.insert(0, new_task)
-    else:
-      self.grab_task(parent).subtasks.append(new_task)
-
-    # update task IDs
-    self.update_IDs()
+    self.insert_task(parent, 0 if top else None, new_task)
 
     # return description
-    return 'added:\n'+justify(new_task.ls())
-
-  # remove a task
+    return 'added:\n'+new_task.ls()
+
+  # add tasks from outline file 'main' (see read_outline), under 'sub'
+  #	or the focus, all in one undo step
+  #	'kind' gives the kind of outline if the file extension doesn't
+  # returns string describing import
+  @undoable
+  def import_tasks(self, main, sub=None, kind=None):
+    parent = self.focus if sub is None else ID_to_list(sub)
+    self.grab_task(parent)
+    with open(main) as f:
+      tasks = read_outline(f, outline_kind(main, kind))
+
+    for t in tasks:
+      self.insert_task(parent, None, t)
+    count = sum(1 for t in tasks for _ in itertools.chain([t], t.descendants()))
+    return f'imported {count} tasks from {main}'
+
+  # write the list, or task 'sub' and its subtasks, to outline file
+  #	'main' (see write_outline)
+  # returns string describing export
+  def export_tasks(self, main, sub=None, kind=None):
+    tasks = self.listed(sub or '')
+    with open(main, 'w') as f:
+      count = write_outline(tasks, f, outline_kind(main, kind))
+    return f'exported {count} tasks to {main}'
+
+  # number of removed tasks shown in full; past that, the first so many
+  #	are named and the rest counted
+  max_described = 10
+
+  # remove tasks picked out by 'main' and predicates (see 'select')
+  #	all at once, taking them out of each parent in one go
   # returns string describing removal and
   # a list of dicts with task data for logging
-  def remove(self, main):
-    self.save_undo_state()
-    # arg 'main' is ID string(s) of task(s) to remove
-    ID_lists = IDs_to_lists(main)
-    # sort lists backwards so removing doesn't change upcoming IDs
-    ID_lists.sort()
-    ID_lists.reverse()
-
-    out = ''
-    logs = []
-    for ID_list in ID_lists:
-      # pop index off end of ID_list, leaving parent ID in ID_list
-      index = ID_list.pop()
-
-      # grab parent and remove subtask
-      removed = self.grab_task(ID_list).subtasks.pop(index)
-      # record names of parent tasks
-      parents = self.list_names(ID_list)
-
-      # add removed task to description and log
-      out += 'removed:\n'+justify(removed.ls())+'\n'
-      log = removed.log()
-      log['parents'] = json.dumps(parents)
-      logs.append(log)
-
-    # update task IDs
-    self.update_IDs()
+  @undoable
+  def remove(self, main='', depth=None, format=None, older=None):
+    groups = self.by_parent(self.select(main, depth, format, older))
+    if not groups:
+      return 'nothing removed', []
 
-    return out.strip(), logs
+    removed = []
+    logs = []
+    for parent, indices in groups.items():
+      # record names of parent tasks, once for all removed from it
+      parents = json.dumps(self.list_names(parent))
+      for t in self.pop_tasks(list(parent), indices):
+        log = t.log()
+        log['parents'] = parents
+        logs.append(log)
+        removed.append(t)
+
+    # describe removed tasks, in list order, and briefly if there's a lot
+    removed.sort(key=lambda t: ID_to_list(t.ID_str))
+    if len(removed) <= self.max_described:
+      return '\n'.join('removed:\n'+t.ls() for t in removed), logs
+    out = [f'removed {len(removed)} tasks:']
+    out += [t.ID_str+' '+t.name for t in removed[:self.max_described]]
+    out.append(f'\u2026 and {len(removed) - self.max_described} more')
+    return '\n'.join(out), logs
+
+  # arg 'main' for 'rename' when it only has an ID, with a new name
+  #	typed in, starting from the current name for editing
+  #	asked for before 'rename' runs, so that the list isn't locked
+  #	while it's typed (see write_ahead_log.transaction)
+  # returns string with ID and new name
+  def ask_name(self, main):
+    ID_list, name = parse_ID_name(main)
+    t = self.grab_task(ID_list)
+    # much obliged to https://stackoverflow.com/a/2533142/791462
+    readline.set_startup_hook(lambda: readline.insert_text(t.name))
+    try:
+      name = input(t.ID_str+' ')
+    finally:
+      readline.set_startup_hook()
+    return ID_to_str(ID_list)+' '+name
 
   # rename task
   # returns a string describing new name
+  @undoable
   def rename(self, main, add=False):
-    self.save_undo_state()
-    # arg 'main' is string with ID and optionally new name
+    # arg 'main' is string with ID and new name (see 'ask_name')
     ID_list, name = parse_ID_name(main)
+    assert name, 'no new name given'
 
     t = self.grab_task(ID_list)
 
-    # if no name is specified, give current text for editing
-    if not name:
-      # much obliged to https://stackoverflow.com/a/2533142/791462
-      readline.set_startup_hook(lambda: readline.insert_text(t.name))
-      try:
-        name = input(t.ID_str+' ')
-        t.name = name
-      finally:
-        readline.set_startup_hook()
-    # if name was specified, rename or add to name
-    elif add:
-      t.name += ' '+name
-    else:
-      t.name = name
+    # add to name if asked
+    if add:
+      name = t.name+' '+name
 
-    return 'renamed:\n'+justify(t.ls(autofold=True))
+    self.set_attr(ID_list, 'name', name)
+
+    return 'renamed:\n'+t.ls(autofold=True)
 
   # move task
   # returns string describing moved task
   # throws AssertionError if unhappy
-  def move(self, main, into='',
-      to='', upto='', upby='', downto='', downby=''):
-    self.save_undo_state()
-    # arg 'main' is ID string of task to move
+  @undoable
+  def move(self, main='', into='',
+      to='', upto='', upby='', downto='', downby='',
+      depth=None, format=None, older=None):
+    # with '-into', arg 'main' and predicates pick out tasks to move
+    #	(see 'select'), otherwise it's the ID string of the task to move
+    if into:
+      return self.move_into(into, self.select(main, depth, format, older))
+
     ID_list = ID_to_list(main)
     # pop index, leaving parent in ID_list
     index = ID_list.pop()
 
     # figure out which type of move, and move it
-    if into:	# move to new parent
-      # get new parent
-      new_parent = ID_to_list(into)
-
-      # remove task, and add to new parent
-      # but grab new parent first so IDs are not disturbed
-      p = self.grab_task(new_parent)
-      t = self.grab_task(ID_list).subtasks.pop(index)
-      p.subtasks.append(t)
-    elif to:	# move to new specific ID
+    if to:	# move to new specific ID
       # convert to list and pop the last element,
       # leaving new parent and new index
       new_parent = ID_to_list(to)
       new_index = new_parent.pop()
-
-      # remove task, and add to new parent at new index
-      p = self.grab_task(new_parent)
-      t = self.grab_task(ID_list).subtasks.pop(index)
-      p.subtasks.insert(new_index, t)
+      t = self.move_task(ID_list, index, new_parent, new_index)
     elif upto or downto or upby or downby: # up or down within parent
       # find new index
       if upto: new_index = int(upto) - 1 # change index-by-0 to -by-1
@@ -534,22 +1775,43 @@ class task_list:
       # make sure new index is at least 0
       new_index = max( new_index, 0 )
 
-      # grab parent (same as old parent) and move subtask
-      p = self.grab_task(ID_list)
-      t = p.subtasks.pop(index)
-      p.subtasks.insert(new_index, t)
+      # same parent as before
+      t = self.move_task(ID_list, index, ID_list, new_index)
     else:
       assert False, "'move' needs an argument."
 
-    # update IDs
-    self.update_IDs()
+    return 'moved:\n'+t.ls(autofold=True)
 
-    return 'moved:\n'+justify(t.ls(autofold=True))
+  # move tasks at 'ID_lists' to the bottom of task 'into', in order
+  # returns string describing moved tasks
+  def move_into(self, into, ID_lists):
+    new_parent = ID_to_list(into)
+    assert ID_lists, 'no tasks to move'
+    for ID_list in ID_lists:
+      assert new_parent[:len(ID_list)] != ID_list, \
+          "can't move a task into its own subtask"
+    # one task moves as before, keeping the write-ahead log record small
+    if len(ID_lists) == 1:
+      ID_list = ID_lists[0]
+      t = self.move_task(ID_list[:-1], ID_list[-1], new_parent)
+      return 'moved:\n'+t.ls(autofold=True)
+
+    # otherwise take them all out, then put them all in
+    #	(the new parent's ID may change on the way, but it stays put)
+    p = self.grab_task(new_parent)
+    moved = []
+    for parent, indices in self.by_parent(ID_lists).items():
+      moved += self.pop_tasks(list(parent), indices)
+    moved.sort(key=lambda t: ID_to_list(t.ID_str))
+    n = len(p.subtasks)
+    self.insert_tasks(ID_to_list(p.ID_str),
+        [(n + i, t) for i, t in enumerate(moved)])
+    return f'moved {len(moved)} tasks into:\n'+p.ls(autofold=True)
 
   # fold task
   # no return value
-  def fold(self, main='', all=False):
-    self.save_undo_state()
+  @undoable
+  def fold(self, main='', all=False, depth=None, format=None, older=None):
     # if 'all' is passed, fold all top-level tasks
     # I cringe at using a built-in name for a kwarg, but
     #	I really want to call it 'all' from the outside
@@ -558,71 +1820,107 @@ class task_list:
       # get list of top-level subtasks and convert to list of IDs
       top_level = self.grab_task(self.focus).subtasks
       ID_lists = [ID_to_list(t.ID_str) for t in top_level]
-    # otherwise arg 'main' is ID string(s) of task(s) to fold
+    # otherwise arg 'main' and predicates pick out tasks to fold
+    #	(see 'select')
     else:
-      ID_lists = IDs_to_lists(main)
+      ID_lists = self.select(main, depth, format, older)
 
     for ID_list in ID_lists:
-      # grab task and fold it
-      t = self.grab_task(ID_list)
-      t.folded = True
+      self.set_attr(ID_list, 'folded', True)
 
   # unfold task
   # no return value
-  def unfold(self, main='', all=False, rall=False):
-    self.save_undo_state()
+  @undoable
+  def unfold(self, main='', all=False, rall=False,
+      depth=None, format=None, older=None):
     # if 'rall' is passed, unfold *all* tasks ('r'ecursively)
     if rall:
-      self.root.recursively_unfold()
-      return
-
+      ID_lists = [ID_to_list(t.ID_str)
+          for t in self.root.descendants() if t.folded]
     # if 'all' is passed, unfold all top-level tasks
-    if all:
+    elif all:
       # get list of top-level subtasks and convert to list of IDs
       top_level = self.grab_task(self.focus).subtasks
       ID_lists = [ID_to_list(t.ID_str) for t in top_level]
-    # otherwise arg 'main' is ID string(s) of task(s) to unfold
+    # otherwise arg 'main' and predicates pick out tasks to unfold
+    #	(see 'select'), bringing back their subtasks if they're archived
     else:
-      ID_lists = IDs_to_lists(main)
+      ID_lists = self.select(main, depth, format, older)
+      for ID_list in ID_lists:
+        if self.grab_task(ID_list).shard:
+          self.unarchive_task(ID_list)
 
     for ID_list in ID_lists:
-      # grab task and unfold it
+      self.set_attr(ID_list, 'folded', False)
+
+  # archive subtasks of tasks picked out by 'main' and predicates (see
+  #	'select'): they go into a file of their own (a shard), leaving the
+  #	task as a stub, so that the rest of the list loads and saves
+  #	without them; unfolding or focusing on the task brings them back
+  #	shards are named by the write-ahead log record they're made in and
+  #	the task's key, plus some random digits, since the same task may
+  #	be archived more than once in a batch
+  # returns string describing archived tasks
+  @undoable
+  def archive(self, main='', depth=None, format=None, older=None):
+    archived = []
+    outer = None
+    for ID_list in self.select(main, depth, format, older):
+      # tasks under one being archived go along with it
+      if outer is not None and ID_list[:len(outer)] == outer:
+        continue
       t = self.grab_task(ID_list)
-      t.folded = False
+      if not t.subtasks:
+        continue
+      outer = ID_list
+      shard = f'{self.wal_seq + 1}-{t.key}-{os.urandom(3).hex()}'
+      self.archive_task(ID_list, shard)
+      archived.append(t)
+
+    if not archived:
+      return 'nothing archived (only tasks with subtasks can be)'
+    return 'archived:\n'+'\n'.join(t.ls() for t in archived)
 
   # set focus
   # no return value
+  @undoable
   def set_focus(self, main):
-    self.save_undo_state()
     # if there's a focus, remember it
+    focus_past = self.focus_past_keys
     if self.focus:
-      self.focus_past.append(self.focus)
+      focus_past = focus_past + [self.focus_key]
 
     # arg 'main' is ID string of task to focus on
-    self.focus = ID_to_list(main)
+    #	if its subtasks are archived, they're brought back to work on
+    ID_list = ID_to_list(main)
+    t = self.grab_task(ID_list)
+    if t.shard:
+      self.unarchive_task(ID_list)
+    self.set_focus_state(t.key, focus_past)
 
   # un-set focus
   # no return value
+  @undoable
   def unset_focus(self):
-    self.save_undo_state()
     # if there's a past focus, return to it; otherwise remove focus
-    if self.focus_past:
-      self.focus = self.focus_past.pop()
+    if self.focus_past_keys:
+      self.set_focus_state(self.focus_past_keys[-1],
+          self.focus_past_keys[:-1])
     else:
-      self.focus = []
+      self.set_focus_state(0, [])
 
   # open, i.e. unfold and focus
   # no return value
+  @undoable
   def open_task(self, main):
-    self.save_undo_state()
     # unfold and focus
     self.unfold(main)
     self.set_focus(main)
 
   # close, i.e. fold and unfocus
   # no return value
+  @undoable
   def close_task(self):
-    self.save_undo_state()
     # fold and unfocus
     self.fold(ID_to_str(self.focus))
     self.unset_focus()
@@ -645,14 +1943,16 @@ class task_list:
 
   # format task
   # no return value
-  def format_task(self, main):
-    self.save_undo_state()
-    # arg 'main' is ID strig of task and key string for format dict
-    ID_list, form = parse_ID_name(main)
+  @undoable
+  def format_task(self, main, depth=None, format=None, older=None):
+    # arg 'main' is selectors of tasks (see 'select') and key string
+    #	for format dict, last
+    selectors, _, form = main.strip().rpartition(' ')
 
     assert form in self.formats, 'format "'+form+'" not recognized\nknown formats: '+' '.join(self.formats.keys())
 
-    self.grab_task(ID_list).format = self.formats[form]
+    for ID_list in self.select(selectors, depth, format, older):
+      self.set_attr(ID_list, 'format', self.formats[form])
 
   # undo last command
   # no return value
@@ -661,22 +1961,1436 @@ class task_list:
     assert self.undo_states, "no undo state found"
 
     state = self.undo_states.pop()
-    self.root = state['root']
-    self.focus = state['focus']
-    self.focus_past = state['focus_past']
+    # replaying the log reproduces the undo states, so this is all it needs
+    self.emit(['undo'])
+    # whole-tree snapshots saved by previous versions
+    if isinstance(state, dict):
+      self.root = state['root']
+      self.keys = None
+      self.key_tasks(self.root.descendants())
+      self.focus_key = self.key_at(state['focus'])
+      self.focus_past_keys = [self.key_at(f) for f in state['focus_past']]
+      return
+
+    self.unwind(state)
+
+
+
+############################################################################
+#
+#	outlines
+#
+############################################################################
+
+
+# kinds of outline, by file extension
+#	anything else is read and written as indented text
+outline_kinds = {'.md': 'md', '.markdown': 'md', '.json': 'json'}
+
+# Markdown headings, and list items with optional checkboxes
+md_heading = re.compile(r'(#{1,6})\s+(.*)')
+md_item = re.compile(r'(\s*)(?:[-*+]|\d+[.)])\s+(?:\[[ xX]\]\s+)?(.*)')
+
+
+# kind of outline in file 'path', or 'kind' if given
+def outline_kind(path, kind=None):
+  if kind:
+    assert kind in ['text', 'md', 'json'], \
+        f'outline kind "{kind}" not recognized, try text, md or json'
+    return kind
+  return outline_kinds.get(os.path.splitext(path)[1].lower(), 'text')
+
+
+# read an outline from open file 'f', in one pass
+#	'text'	one task per line, nested by indentation
+#	'md'	list items nested by indentation, under headings nested by
+#		level; other lines are left out
+#	'json'	list of tasks (or one task) as from task.to_dict, where
+#		only 'name' is needed
+# returns list of top-level tasks, with their subtasks
+def read_outline(f, kind):
+  if kind == 'json':
+    return json_outline(json.load(f))
+
+  # tasks which may take subtasks, as (nesting key, task), outermost
+  #	first; headings nest by level, and anything indented nests under
+  #	the last less indented line (or the last heading)
+  top = task('')
+  stack = [((-1,), top)]
+  for line in f:
+    line = line.rstrip().expandtabs(4)
+    if not line:
+      continue
+    if kind == 'md':
+      heading = md_heading.match(line)
+      item = None if heading else md_item.match(line)
+      if heading:
+        key, name = (0, len(heading[1])), heading[2]
+      elif item:
+        key, name = (1, len(item[1])), item[2]
+      else:
+        continue
+    else:
+      name = line.lstrip()
+      key = (1, len(line) - len(name))
+
+    while stack[-1][0] >= key:
+      stack.pop()
+    t = task(name.strip())
+    parent = stack[-1][1]
+    if not parent.subtasks: parent.subtasks = []
+    parent.subtasks.append(t)
+    stack.append((key, t))
+
+  return list(top.subtasks)
+
+
+# make tasks from 'data' read from a JSON outline
+# returns list of top-level tasks, with their subtasks
+def json_outline(data):
+  top = task('')
+  stack = [(top, data if isinstance(data, list) else [data])]
+  while stack:
+    parent, items = stack.pop()
+    if items:
+      parent.subtasks = []
+    for d in items:
+      assert isinstance(d, dict) and 'name' in d, \
+          'JSON outline tasks need a "name"'
+      t = task(str(d['name']))
+      t.format = d.get('format', '')
+      t.folded = bool(d.get('folded', False))
+      if d.get('start_date'):
+        t.start_date = d['start_date']
+      parent.subtasks.append(t)
+      stack.append((t, d.get('subtasks', [])))
+  return list(top.subtasks)
+
+
+# write 'tasks' and their subtasks to open file 'f' as an outline of
+#	kind 'kind' (see read_outline), a line at a time
+# returns number of tasks written
+def write_outline(tasks, f, kind):
+  count = 0
+  # iterators over the subtasks at each level being written
+  stack = [iter(tasks)]
+  if kind == 'json':
+    f.write('[')
+  first = True
+  while stack:
+    t = next(stack[-1], None)
+    if t is None:
+      stack.pop()
+      if kind == 'json':
+        # close subtasks, and the task they belong to
+        f.write(']}' if stack else '\n]\n')
+      first = False
+      continue
+
+    count += 1
+    indent = '  ' * (len(stack) - 1)
+    if kind == 'json':
+      head = json.dumps({'name': t.name, 'format': t.format,
+          'folded': t.folded, 'start_date': t.start_date})
+      f.write((',' if not first else '')+'\n'+indent+'  '+head[:-1]+
+          ', "subtasks": [')
+    elif kind == 'md':
+      f.write(f'{indent}- [ ] {t.name}\n')
+    else:
+      f.write(f'{indent}{t.name}\n')
+    stack.append(iter(t.subtasks))
+    first = True
+
+  return count
+
+
+
+############################################################################
+#
+#	persistence
+#
+############################################################################
+
+
+# save file format
+#	the task tree is stored as flat arrays with one entry per task, in
+#	breadth-first order so that each task's subtasks are next to each
+#	other, followed by the names, the index of words in the names (see
+#	'find'), and then the rest of the task_list pickled; read through
+#	mmap, so opening a save file costs the same however big it is, and
+#	tasks only become objects when something looks at them (see class
+#	stored_task)
+
+tree_magic = b'TODOTREE'
+tree_version = 3
+
+# magic, version, number of tasks, offset and length of pickled task_list
+tree_header = struct.Struct('<8sIIQQ')
+
+# per-task arrays in file order, as (name, array typecode)
+#	parent		index of parent task (-1 for root)
+#	first		index of first subtask
+#	count		number of subtasks
+#	name		offset of name in names (one extra entry, for the end)
+#	format		index of format in list of formats used
+#	folded		fold flag
+#	day		start date as day number (date.toordinal), 0 if unknown
+#	key		key of task (see task_list.task_by_key), new in version 2
+#	shard		index of shard in list of shards plus one, 0 if the
+#			task's subtasks aren't archived (see 'archive'), new in
+#			version 3
+tree_columns = [('parent', 'i'), ('first', 'I'), ('count', 'I'),
+    ('name', 'I'), ('format', 'H'), ('folded', 'B'), ('day', 'i'),
+    ('key', 'I'), ('shard', 'I')]
+
+# arrays in save files of each version
+#	version 1 files have no keys, and tasks are keyed by position instead
+tree_versions = {1: tree_columns[:-2], 2: tree_columns[:-1], 3: tree_columns}
+
+
+# offset of each array in a save file with 'n' tasks, and of the names
+# returns a dict of offsets by array name, plus 'names'
+def tree_layout(n, columns=tree_columns):
+  offsets = {}
+  offset = tree_header.size
+  for col, code in columns:
+    offsets[col] = offset
+    length = (n + 1 if col == 'name' else n) * array(code).itemsize
+    # keep arrays aligned to 8 bytes
+    offset += -(-length // 8) * 8
+  offsets['names'] = offset
+  return offsets
+
+
+# write to-do list to open file 'f' in the save file format
+def write_tree(todo_list, f):
+  cols = {col: array(code) for col, code in tree_columns}
+  formats = {}
+  shards = []
+  names = []
+  name_end = 0
+  words = {}				# word -> positions of tasks with it, see 'find'
+
+  # go through tasks breadth-first, noting where each one's subtasks start
+  order = [todo_list.root]
+  cols['parent'].append(-1)
+  i = 0
+  while i < len(order):
+    t = order[i]
+    cols['first'].append(len(order))
+    cols['count'].append(len(t.subtasks))
+    for sub in t.subtasks:
+      order.append(sub)
+      cols['parent'].append(i)
+
+    if i:
+      for word in name_words(t.name):
+        words.setdefault(word, array('I')).append(i)
+
+    name = t.name.encode()
+    names.append(name)
+    cols['name'].append(name_end)
+    name_end += len(name)
+    cols['format'].append(formats.setdefault(t.format, len(formats)))
+    cols['folded'].append(bool(t.folded))
+    cols['day'].append(t.day)
+    cols['key'].append(t.key)
+    if t.shard:
+      shards.append(t.shard)
+    cols['shard'].append(len(shards) if t.shard else 0)
+    i += 1
+  cols['name'].append(name_end)
+
+  n = len(order)
+  offsets = tree_layout(n)
+  index = pickle.dumps({word: a.tobytes() for word, a in words.items()})
+  index_offset = offsets['names'] + name_end
+
+  # everything but the tree and undo history, plus the formats and shards
+  #	used and where the index is
+  state = todo_list.__getstate__()
+  del state['root']
+  del state['undo_states']
+  meta = pickle.dumps({'state': state, 'formats': list(formats),
+      'shards': shards, 'index': (index_offset, len(index))})
+  meta_offset = index_offset + len(index)
+  f.write(tree_header.pack(tree_magic, tree_version, n, meta_offset, len(meta)))
+  for col, code in tree_columns:
+    f.write(b'\0' * (offsets[col] - f.tell()))
+    f.write(cols[col].tobytes())
+  f.write(b'\0' * (offsets['names'] - f.tell()))
+  f.write(b''.join(names))
+  f.write(index)
+  f.write(meta)
+
+
+# read to-do list from open file 'f' in the save file format
+#	'path' is where it is, for the undo history kept next to it
+#	(save files from before that have it inside)
+# returns the to-do list
+def read_tree(f, path=None):
+  store = tree_file(f)
+  todo_list = task_list.__new__(task_list)
+  todo_list.root = store.make(0, None, 0)
+  state = dict(store.meta['state'])
+  # version 1 tasks are keyed by position, so keys go up to the count
+  state.setdefault('next_key', len(store.count))
+  todo_list.__setstate__(state)
+  if 'undo_states' not in state and path:
+    todo_list.undo_states = undo_history.load(path, todo_list.wal_seq)
+  if store.index:
+    todo_list.search = search_index(store)
+  return todo_list
+
+
+# save file mapped into memory, making tasks on request
+class tree_file:
+  def __init__(self, f):
+    self.mm = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+    magic, version, n, meta_offset, meta_length = \
+        tree_header.unpack_from(self.mm)
+    assert version in tree_versions, \
+        f'save file version {version} not recognized'
+    columns = tree_versions[version]
+    self.key = None			# no keys before version 2
+    self.shard = None			# no shards before version 3
+
+    # arrays are read in place, straight from the mapped file
+    offsets = tree_layout(n, columns)
+    view = memoryview(self.mm)
+    for col, code in columns:
+      length = (n + 1 if col == 'name' else n) * array(code).itemsize
+      setattr(self, col, view[offsets[col]:offsets[col]+length].cast(code))
+    self.names = offsets['names']
+
+    self.meta = pickle.loads(self.mm[meta_offset:meta_offset+meta_length])
+    self.codes = [format_code(form) for form in self.meta['formats']]
+    self.shards = self.meta.get('shards', [])
+    self.index = self.meta.get('index')	# where the word index is, if saved
+    self.postings = None		# word index, read when first needed
+    self.made = {}			# tasks made so far, by index
+
+  # make an object for task 'i', subtask 'index' of task 'parent'
+  # returns the task
+  def make(self, i, parent, index):
+    t = stored_task.__new__(stored_task)
+    start = self.names + self.name[i]
+    end = self.names + self.name[i+1]
+    t.name = str(self.mm[start:end], 'utf-8')
+    t.parent = parent
+    t.index = index
+    t.folded = bool(self.folded[i])
+    t.code = self.codes[self.format[i]]
+    day = self.day[i]
+    t.day = day_numbers.setdefault(day, day)
+    t.key = self.key[i] if self.key is not None else i
+    shard = self.shard[i] if self.shard is not None else 0
+    t.shard = tuple(self.shards[shard-1]) if shard else None
+    t.cache = None
+    t.span = None
+    t.store = self
+    t.position = i
+    self.made[i] = t
+    return t
+
+  # task 'i', making it and the tasks above it if they haven't been
+  # returns the task, or None if it's since been archived (see 'archive')
+  def task(self, i):
+    if i not in self.made:
+      # making a task's subtasks makes all of them at once
+      parent = self.task(self.parent[i])
+      if parent is not None:
+        parent.subtasks
+    return self.made.get(i)
+
+  # indices of tasks with 'word' in their names
+  # returns a set of indices
+  def words(self, word):
+    if self.postings is None:
+      offset, length = self.index
+      self.postings = pickle.loads(self.mm[offset:offset+length])
+    return set(array('I', self.postings.get(word, b'')))
+
+
+# subtasks of stored_task 't' before they've all been made, as a
+#	sequence which makes each one when it's asked for
+class stored_subtasks:
+  def __init__(self, t):
+    self.t = t
+
+  def __len__(self):
+    return self.t.subtask_count()
+
+  def __getitem__(self, index):
+    return self.t.subtask(index)
+
+
+# task read from a save file, whose subtasks only become objects when
+#	they're first asked for
+class stored_task(task):
+  __slots__ = ('store', 'position')
+
+  # subtasks not made yet are counted, and made one at a time, from the
+  #	save file; once they're all made, they're the ones used
+  def subtask_count(self):
+    try:
+      return len(task.subtasks.__get__(self))
+    except AttributeError:
+      return self.store.count[self.position]
+
+  def subtask(self, index):
+    try:
+      return task.subtasks.__get__(self)[index]
+    except AttributeError:
+      pass
+    store = self.store
+    count = store.count[self.position]
+    if index < 0:
+      index += count
+    if not 0 <= index < count:
+      raise IndexError('list index out of range')
+    i = store.first[self.position] + index
+    return store.made.get(i) or store.make(i, self, index)
+
+  def children(self, rest):
+    try:
+      subtasks = task.subtasks.__get__(self)
+    except AttributeError:
+      subtasks = stored_subtasks(self)
+    return task.children(self, rest, subtasks)
+
+  # only called if 'subtasks' hasn't been made yet
+  def __getattr__(self, attr):
+    if attr != 'subtasks':
+      raise AttributeError(attr)
+    store = self.store
+    first = store.first[self.position]
+    # any made one at a time already are used, so there's one of each
+    self.subtasks = [store.made.get(first+k) or store.make(first+k, self, k)
+        for k in range(store.count[self.position])] or ()
+    return self.subtasks
+
+  # pickle (and copy) as an ordinary task
+  def __reduce__(self):
+    return (task.__new__, (task,), self.__getstate__())
+
+
+# names of shards referred to by 'obj': a task, whose stubs (and theirs)
+#	refer to them, along with the shards archived inside them, or an
+#	undo step or anything else made of tuples and lists of tasks and
+#	shard names (see task_list.revert)
+# returns a set of names
+def shards_in(obj):
+  if isinstance(obj, task):
+    names = set()
+    for t in itertools.chain([obj], obj.descendants()):
+      if t.shard:
+        names.add(t.shard[0])
+        # stubs from before shards inside were named don't have them
+        names.update(t.shard[2] if len(t.shard) > 2 else ())
+    return names
+  if isinstance(obj, str):
+    return {obj}
+  if isinstance(obj, (tuple, list)):
+    return set().union(*(shards_in(item) for item in obj))
+  return set()
+
+
+# write-ahead log of changes to a to-do list
+#	rather than rewriting the whole save file after every command, the
+#	changes each command makes are appended to the log as one line of
+#	JSON, numbered by 'seq'; loading replays the records newer than the
+#	save file, and once the log grows past 'compact_size' bytes a fresh
+#	save file is written in the background and the log starts over
+#
+#	several processes may share the files: each command runs as a
+#	'transaction', holding a lock while it catches up with what others
+#	have written, makes its changes and appends them; the appends are
+#	then flushed to disk together with any others made within
+#	'group_window' seconds, rather than one fsync each
+#
+#	within a process, threads take turns with 'mutex'; the editor loop
+#	uses this to sync and compact in the background (see 'write_behind')
+class write_ahead_log:
+  def __init__(self, path, save_file, compact_size=256*1024,
+      group_window=0.002):
+    self.path = path
+    self.save_file = save_file
+    self.compact_size = compact_size
+    self.group_window = group_window
+    self.seen = None			# files as last read or written, see 'stale'
+    self.lock_file = None		# open while holding the lock
+    self.lock_depth = 0			# number of nested 'locked' contexts
+    self.mutex = threading.RLock()	# held by the thread using the files
+    self.queue = None			# records to sync, see 'write_behind'
+    self.error = None			# what went wrong syncing them, if anything
+
+  # size, modification time and inode of save file and live log
+  def stamp(self):
+    out = []
+    for f in [self.save_file, self.path]:
+      try:
+        st = os.stat(f)
+        out.append((st.st_ino, st.st_size, st.st_mtime_ns))
+      except FileNotFoundError:
+        out.append(None)
+    return out
+
+  # whether another process has changed the files since we last looked
+  def stale(self):
+    return self.stamp() != self.seen
+
+  # log files, oldest first: logs set aside by compaction, then the live one
+  def files(self):
+    directory, base = os.path.split(self.path)
+    rotated = []
+    for f in os.listdir(directory or '.'):
+      suffix = f[len(base)+1:]
+      if f.startswith(base+'.') and suffix.isdigit():
+        rotated.append((int(suffix), os.path.join(directory, f)))
+    rotated.sort()
+    return [f for _, f in rotated] + [self.path]
+
+  # context holding the lock that writers of the files take turns with
+  #	re-entrant, so things that need it may be called while holding it
+  @contextmanager
+  def locked(self):
+    with self.mutex:
+      if not self.lock_depth:
+        self.lock_file = open(self.path+'.lock', 'a')
+        fcntl.flock(self.lock_file, fcntl.LOCK_EX)
+      self.lock_depth += 1
+      try:
+        yield
+      finally:
+        self.lock_depth -= 1
+        if not self.lock_depth:
+          # closing releases the lock
+          self.lock_file.close()
+          self.lock_file = None
+
+  # read to-do list from save file and replay the log on top of it
+  # returns the to-do list
+  def load(self):
+    with self.locked():
+      todo_list = load_tasks(self.save_file)
+      self.attach(todo_list)
+    return todo_list
+
+  # read to-do list as 'load' does, but without taking the lock, so
+  #	that a process busy with the list doesn't hold this up; for looking
+  #	at the list, not changing it
+  #	the files may change meanwhile: if the records don't follow on
+  #	from the save file and each other (a compaction removed the ones in
+  #	between), it starts over, up to 'attempts' times
+  # returns the to-do list
+  def read(self, attempts=5):
+    for _ in range(attempts):
+      todo_list = load_tasks(self.save_file)
+      gap = False
+      for log_file in self.files():
+        try:
+          f = open(log_file)
+        except FileNotFoundError:
+          continue
+        with f:
+          for line in f:
+            # a line still being appended is left for next time
+            try:
+              record = json.loads(line)
+            except ValueError:
+              break
+            if record['seq'] <= todo_list.wal_seq:
+              continue
+            if record['seq'] != todo_list.wal_seq + 1:
+              gap = True
+              break
+            todo_list.replay(record['ops'])
+            todo_list.wal_seq = record['seq']
+        if gap:
+          break
+      if not gap:
+        return todo_list
+    assert False, 'the list kept changing while being read, try again'
+
+  # replay records newer than the list, then (carry on) recording changes
+  def attach(self, todo_list):
+    pending, todo_list.pending = todo_list.pending, None
+    with self.locked(), timing('replay log'):
+      for log_file in self.files():
+        try:
+          f = open(log_file)
+        except FileNotFoundError:
+          continue
+        with f:
+          for line in f:
+            # a torn last line from a crash mid-append is dropped
+            try:
+              record = json.loads(line)
+            except ValueError:
+              break
+            if record['seq'] <= todo_list.wal_seq:
+              continue
+            todo_list.replay(record['ops'])
+            todo_list.wal_seq = record['seq']
+      self.seen = self.stamp()
+    todo_list.pending = pending if pending is not None else []
+
+  # bring the list up to date with changes saved by other processes
+  #	if the save file was rewritten past us, the log records we'd need
+  #	may be gone, so take the list from the save file instead
+  def catch_up(self, todo_list):
+    with self.locked():
+      if not self.stale():
+        return
+      if self.seen is None or self.stamp()[0] != self.seen[0]:
+        fresh = load_tasks(self.save_file)
+        if fresh.wal_seq > todo_list.wal_seq:
+          todo_list.__setstate__(fresh.__getstate__())
+          todo_list.search = fresh.search
+      self.attach(todo_list)
+
+  # context in which to look at the list without changing it: it's
+  #	brought up to date with other processes first, but they aren't
+  #	kept waiting on the lock while it's looked at
+  @contextmanager
+  def reading(self, todo_list):
+    with self.mutex:
+      self.catch_up(todo_list)
+      yield
+
+  # context in which to make changes, which are saved at the end
+  #	nested transactions (e.g. the commands of a batch) are merged into
+  #	the outermost one, and saved with it
+  #	with 'write_behind', the record is left to be synced in the
+  #	background; otherwise it's synced before going on
+  @contextmanager
+  def transaction(self, todo_list):
+    with self.mutex:
+      if self.lock_depth:
+        yield
+        return
+
+      with self.locked():
+        with timing('catch up'):
+          self.catch_up(todo_list)
+        yield
+        with timing('write log'):
+          written = self.write(todo_list)
+
+      if not written:
+        return
+      if self.queue is not None:
+        with self.wake:
+          self.queue.append(written)
+          self.wake.notify_all()
+        return
+      f, end = written
+      with f, timing('sync log'):
+        self.sync(f, end)
+      if end > self.compact_size:
+        with timing('compact'):
+          self.compact(todo_list)
+
+  # from now on, sync records and compact the log in a background thread
+  #	records are still appended as each transaction ends, in order with
+  #	other processes, and those appended while the thread is busy are
+  #	synced all at once
+  #	'flush' waits for the thread to catch up
+  def write_behind(self, todo_list):
+    self.queue = []
+    self.wake = threading.Condition()
+    threading.Thread(target=self.writer, args=(todo_list,),
+        daemon=True).start()
+
+  # sync queued records, and compact if it's due, until the process ends
+  #	records stay queued until they're synced, so 'flush' can wait for them
+  def writer(self, todo_list):
+    while True:
+      with self.wake:
+        while not self.queue:
+          self.wake.wait()
+        written = self.queue[:]
+      try:
+        # syncing the last record in each file syncs the ones before it
+        last = {os.fstat(f.fileno()).st_ino: (f, end) for f, end in written}
+        for f, end in last.values():
+          self.sync(f, end)
+        if written[-1][1] > self.compact_size:
+          self.compact(todo_list)
+      except Exception as error:
+        self.error = error
+      finally:
+        for f, end in written:
+          f.close()
+      with self.wake:
+        del self.queue[:len(written)]
+        self.wake.notify_all()
+
+  # wait for records left to the background thread to be synced
+  # throws what went wrong in the thread since last asked, if anything
+  def flush(self):
+    if self.queue is not None:
+      with self.wake:
+        while self.queue:
+          self.wake.wait()
+    self.check()
+
+  # throws what went wrong in the background thread since last asked,
+  #	if anything
+  def check(self):
+    error, self.error = self.error, None
+    if error is not None:
+      raise error
+
+  # append changes since the last commit as one record, without waiting
+  #	for it to reach the disk
+  # returns the open log file and its size after the record, or None if
+  #	there was nothing to write
+  def write(self, todo_list):
+    if not todo_list.pending:
+      return None
+    record = {'seq': todo_list.wal_seq + 1, 'ops': todo_list.pending}
+    line = json.dumps(record, separators=(',', ':')) + '\n'
+    with self.locked():
+      f = open(self.path, 'a')
+      f.write(line)
+      f.flush()
+      todo_list.wal_seq += 1
+      todo_list.pending = []
+      self.seen = self.stamp()
+    return f, f.tell()
+
+  # make sure log file 'f' is on disk up to 'end'
+  #	whoever gets here first waits a moment for others to append, then
+  #	syncs for all of them and notes how far it got, so the rest can
+  #	skip their own sync (group commit)
+  def sync(self, f, end):
+    ino = os.fstat(f.fileno()).st_ino
+    with open(self.path+'.sync', 'a+') as mark:
+      fcntl.flock(mark, fcntl.LOCK_EX)
+      mark.seek(0)
+      synced = mark.read().split()
+      if synced and int(synced[0]) == ino and int(synced[1]) >= end:
+        return
+      time.sleep(self.group_window)
+      size = os.fstat(f.fileno()).st_size
+      os.fsync(f.fileno())
+      mark.seek(0)
+      mark.truncate()
+      mark.write(f'{ino} {size}')
+
+  # write a fresh save file and drop the log records it covers
+  #	the live log is renamed out of the way first, so new records go to
+  #	a new log while a forked child writes the save file
+  #	(rotated logs are named by the last record in them)
+  #	the undo steps are saved here rather than in the child, so that
+  #	this process carries on from the file (see undo_history.save)
+  #	a process with other threads running (e.g. 'write_behind') isn't
+  #	forked, as the child could inherit a lock one of them holds;
+  #	the save file is written by the calling thread instead, holding
+  #	'mutex' so the list stays put meanwhile
+  def compact(self, todo_list, background=True):
+    with self.mutex:
+      with self.locked():
+        # the rotated log must hold everything up to the list's last record
+        self.catch_up(todo_list)
+        written = self.write(todo_list)
+        if written:
+          written[0].close()
+        # set aside the live log, unless it's empty (i.e. nothing has been
+        #	written since another compaction started it)
+        rotated = f'{self.path}.{todo_list.wal_seq}'
+        if os.path.exists(self.path) and os.path.getsize(self.path):
+          os.replace(self.path, rotated)
+          # start a new log right away, so others see it has changed
+          open(self.path, 'a').close()
+        self.seen = self.stamp()
+        # save file as it was, to check nobody replaced it in the meantime
+        expected = self.seen[0]
+        todo_list.undo_states.save(self.save_file, todo_list.wal_seq,
+            rebase=True)
+
+      if (background and hasattr(os, 'fork')
+          and threading.active_count() == 1):
+        # fork twice so the writer is not left as a zombie of this process
+        pid = os.fork()
+        if pid:
+          os.waitpid(pid, 0)
+          return
+        try:
+          if os.fork() == 0:
+            self.lock_file = None
+            self.lock_depth = 0
+            self.checkpoint(todo_list, expected)
+        finally:
+          os._exit(0)
+      else:
+        self.checkpoint(todo_list, expected)
+
+  # save a snapshot and delete the rotated logs it makes redundant
+  #	if another process got a snapshot in first, ours is dropped; theirs
+  #	was started after, or has already deleted logs we were covering
+  #	(the undo steps saved by 'compact' stay listed for either save)
+  def checkpoint(self, todo_list, expected):
+    tmp_file = f'{self.save_file}.{os.getpid()}.tmp'
+    dump_tasks(todo_list, tmp_file)
+
+    with self.locked():
+      if self.stamp()[0] != expected:
+        os.remove(tmp_file)
+        return
+      os.replace(tmp_file, self.save_file)
+      for log_file in self.files()[:-1]:
+        if int(log_file.rsplit('.', 1)[1]) <= todo_list.wal_seq:
+          os.remove(log_file)
+      self.collect_shards(todo_list)
+
+  # remove shards (see task_list.archive) that nothing can bring back
+  #	any more, with the lock held, after saving 'todo_list'
+  #	a shard is kept if it's newer than the save, as processes behind
+  #	it might still replay its making, or if a stub in the list, in its
+  #	undo history or in the records left in the log refers to it
+  def collect_shards(self, todo_list):
+    shard_dir = todo_list.shard_dir
+    if not shard_dir or not os.path.isdir(shard_dir):
+      return
+    keep = shards_in([todo_list.root, todo_list.undo_states.all_steps()])
+    for log_file in self.files():
+      try:
+        with open(log_file) as f:
+          logged = f.read()
+      except FileNotFoundError:
+        continue
+      keep.update(shard for shard in os.listdir(shard_dir) if shard in logged)
+    for shard in os.listdir(shard_dir):
+      seq = shard.split('-', 1)[0]
+      if shard not in keep and seq.isdigit() and int(seq) <= todo_list.wal_seq:
+        os.remove(os.path.join(shard_dir, shard))
+
+
+
+############################################################################
+#
+#	task log
+#
+############################################################################
+
+
+# fields of each record in the log of finished tasks, in order
+#	as made by task.log, plus 'parents' (JSON list of the names of the
+#	tasks it was under) and 'command' (the command that removed it)
+log_fields = ['name', 'ID_str', 'parents', 'start_date', 'end_date', 'command']
+
+
+# log segment format
+#	one file per month of end dates, holding that month's records as
+#	columns: dates as day numbers (date.toordinal, 0 if unknown), and
+#	commands and parent paths as indices into lists of the distinct
+#	ones, which are stored once at the end of the file
+
+log_magic = b'TODOLOGS'
+log_version = 1
+
+# magic, version, number of records, lengths of names, IDs and lists
+log_header = struct.Struct('<8sIIIII')
+
+# number columns in file order, as (name, array typecode)
+#	start, end	start and end dates as day numbers
+#	parents		index of parent path in list of paths
+#	name, ID	offsets in names / IDs (one extra entry, for the end)
+#	command		index of command in list of commands
+log_columns = [('start', 'i'), ('end', 'i'), ('parents', 'I'), ('name', 'I'),
+    ('ID', 'I'), ('command', 'H')]
+
+
+# day number of ISO date string 'date', 0 if it's empty or unreadable
+def log_day(date):
+  try:
+    return datetime.date.fromisoformat(date).toordinal()
+  except (TypeError, ValueError):
+    return 0
+
+
+# day numbers of the first and last days of 'date', given as
+#	YYYY-MM-DD or YYYY-MM
+# returns tuple of day numbers
+def date_span(date):
+  try:
+    if len(date) == 7:
+      first = datetime.date.fromisoformat(date+'-01')
+      after = (first + datetime.timedelta(days=31)).replace(day=1)
+      return first.toordinal(), after.toordinal() - 1
+    day = datetime.date.fromisoformat(date).toordinal()
+    return day, day
+  except ValueError:
+    raise AssertionError(f'date "{date}" not understood, try YYYY-MM-DD or YYYY-MM')
+
+
+# records of one month of the log, as columns
+class log_segment:
+  def __init__(self):
+    for col, code in log_columns:
+      if col not in ['name', 'ID']:
+        setattr(self, col, array(code))
+    self.names = []				# task names
+    self.IDs = []				# task ID strings
+    self.paths = []				# distinct parent paths, as JSON
+    self.commands = []				# distinct commands
+    self.codes = {}				# index of each path / command
+
+  # read segment from file at 'path'
+  # returns the segment
+  @classmethod
+  def read(cls, path):
+    with open(path, 'rb') as f:
+      data = f.read()
+    magic, version, n, names_len, IDs_len, lists_len = \
+        log_header.unpack_from(data)
+    assert magic == log_magic and version == log_version, \
+        f'log segment {path} not recognized'
+
+    seg = cls()
+    offset = log_header.size
+    for col, code in log_columns:
+      length = (n + 1 if col in ['name', 'ID'] else n) * array(code).itemsize
+      column = array(code, data[offset:offset+length])
+      offset += length
+      if col == 'name': name_ends = column
+      elif col == 'ID': ID_ends = column
+      else: setattr(seg, col, column)
+
+    # strings are stored back to back, split by the offsets
+    for ends, attr, length in [(name_ends, 'names', names_len),
+        (ID_ends, 'IDs', IDs_len)]:
+      blob = data[offset:offset+length].decode()
+      offset += length
+      setattr(seg, attr, [blob[ends[i]:ends[i+1]] for i in range(n)])
+
+    lists = json.loads(data[offset:offset+lists_len])
+    seg.paths = lists['paths']
+    seg.commands = lists['commands']
+    return seg
+
+  # write segment to file at 'path', replacing it all at once
+  def write(self, path):
+    n = len(self.end)
+    blobs = []
+    ends = {}
+    for attr, col in [('names', 'name'), ('IDs', 'ID')]:
+      # offsets count characters, as the blob is decoded before splitting
+      ends[col] = array('I', itertools.accumulate(
+          (len(s) for s in getattr(self, attr)), initial=0))
+      blobs.append(''.join(getattr(self, attr)).encode())
+    lists = json.dumps({'paths': self.paths, 'commands': self.commands}).encode()
+
+    tmp_file = f'{path}.{os.getpid()}.tmp'
+    with open(tmp_file, 'wb') as f:
+      f.write(log_header.pack(log_magic, log_version, n,
+          len(blobs[0]), len(blobs[1]), len(lists)))
+      for col, code in log_columns:
+        f.write((ends[col] if col in ends else getattr(self, col)).tobytes())
+      for blob in blobs:
+        f.write(blob)
+      f.write(lists)
+      f.flush()
+      os.fsync(f.fileno())
+    os.replace(tmp_file, path)
+
+  # index of 'value' in list 'values' (paths or commands), adding it if new
+  def code(self, values, value):
+    if not self.codes:
+      self.codes = {('paths', v): i for i, v in enumerate(self.paths)}
+      self.codes.update(
+          {('commands', v): i for i, v in enumerate(self.commands)})
+    key = (values, value)
+    if key not in self.codes:
+      self.codes[key] = len(getattr(self, values))
+      getattr(self, values).append(value)
+    return self.codes[key]
+
+  # add a record, a dict with the keys in 'log_fields'
+  #	('parents' and 'command' may be left out)
+  def add(self, log):
+    self.start.append(log_day(log['start_date']))
+    self.end.append(log_day(log['end_date']))
+    self.parents.append(self.code('paths', log.get('parents') or '[]'))
+    self.command.append(self.code('commands', log.get('command', '')))
+    self.names.append(log['name'])
+    self.IDs.append(log['ID_str'])
+
+  # records with end dates from day 'first' to day 'last'
+  # returns list of dicts with the keys in 'log_fields'
+  def records(self, first=0, last=float('inf')):
+    out = []
+    for i, end in enumerate(self.end):
+      if not first <= end <= last:
+        continue
+      start = self.start[i]
+      out.append({
+          'name'        : self.names[i],
+          'ID_str'      : self.IDs[i],
+          'parents'     : self.paths[self.parents[i]],
+          'start_date'  : datetime.date.fromordinal(start).isoformat()
+              if start else '',
+          'end_date'    : datetime.date.fromordinal(end).isoformat()
+              if end else '',
+          'command'     : self.commands[self.command[i]]
+          })
+    return out
+
+
+# log of finished tasks, as a directory of monthly segments
+#	records are appended (and synced) to a small tail file for their
+#	month, '<month>.tail', as lines of JSON after a first line saying
+#	how many records the segment had when the tail was started; the tail
+#	is folded into the segment once it's big, or its month is over
+#	'index.json' there holds the first and last end date and number of
+#	records in each segment, so that a query for some dates only reads
+#	the segments which have any (and the tails, which are few and small)
+#	folding writes the index before the segment, so it covers the
+#	segment even if the segment doesn't get written; a tail left behind
+#	after its segment was written is known by the count in it, and
+#	skipped
+#	a log from previous versions ('csv_file') is moved into segments
+#	the first time the log is used, and kept renamed to '.migrated'
+class task_log:
+  tail_size = 64*1024			# bytes past which a tail is folded in
+
+  def __init__(self, path, csv_file=None):
+    self.path = path
+    self.csv_file = csv_file
+    self.index_file = os.path.join(path, 'index.json')
+
+  # segment file for month 'month' (YYYY-MM, or 'undated')
+  def segment_file(self, month):
+    return os.path.join(self.path, month+'.seg')
+
+  # tail file for month 'month'
+  def tail_file(self, month):
+    return os.path.join(self.path, month+'.tail')
+
+  # context holding a lock on the log, so that appends don't collide
+  @contextmanager
+  def locked(self):
+    os.makedirs(self.path, exist_ok=True)
+    with open(os.path.join(self.path, 'lock'), 'a') as lock_file:
+      fcntl.flock(lock_file, fcntl.LOCK_EX)
+      yield
+
+  # read the index of segments
+  # returns dict of [first day, last day, records] by month
+  def index(self):
+    try:
+      with open(self.index_file) as f:
+        return json.load(f)
+    except FileNotFoundError:
+      return {}
+
+  # replace the index with 'index', making sure it's on disk
+  def write_index(self, index):
+    tmp_file = f'{self.index_file}.{os.getpid()}.tmp'
+    with open(tmp_file, 'w') as f:
+      json.dump(dict(sorted(index.items())), f)
+      f.flush()
+      os.fsync(f.fileno())
+    os.replace(tmp_file, self.index_file)
+
+  # months with a tail file, sorted
+  def tails(self):
+    try:
+      files = os.listdir(self.path)
+    except FileNotFoundError:
+      return []
+    return sorted(f[:-len('.tail')] for f in files if f.endswith('.tail'))
+
+  # size and modification time of the index and tails, which change
+  #	whenever records are added
+  # returns list, empty if nothing's been logged
+  def stamp(self):
+    out = []
+    for f in [self.index_file] + [self.tail_file(m) for m in self.tails()]:
+      try:
+        st = os.stat(f)
+        out.append((f, st.st_size, st.st_mtime_ns))
+      except FileNotFoundError:
+        pass
+    return out
 
-  # save an undo state
-  def save_undo_state(self):
-    # record state in a dict
-    state = {
-        'root': deepcopy(self.root),
-        'focus': deepcopy(self.focus),
-        'focus_past': deepcopy(self.focus_past)}
-    # add to undo states
-    self.undo_states.append(state)
-    # pop down to max_undo_depth
-    while len(self.undo_states) > self.max_undo_depth:
-      self.undo_states.pop(0)
+  # number of records in the segment for 'month', from its header
+  def segment_count(self, month):
+    try:
+      with open(self.segment_file(month), 'rb') as f:
+        return log_header.unpack(f.read(log_header.size))[2]
+    except FileNotFoundError:
+      return 0
+
+  # whether the tail of 'month' was left behind after being folded in
+  def stale_tail(self, month):
+    try:
+      with open(self.tail_file(month)) as f:
+        after = json.loads(f.readline())['after']
+    except (FileNotFoundError, ValueError):
+      return False
+    return self.segment_count(month) > after
+
+  # segment for 'month' with the records in its tail added, unless the
+  #	tail was folded in already
+  # returns the segment
+  def segment(self, month):
+    try:
+      seg = log_segment.read(self.segment_file(month))
+    except FileNotFoundError:
+      seg = log_segment()
+    try:
+      f = open(self.tail_file(month))
+    except FileNotFoundError:
+      return seg
+    with f:
+      lines = f.read().split('\n')
+    # a torn first line means nothing was folded in since
+    try:
+      after = json.loads(lines[0])['after']
+    except ValueError:
+      after = len(seg.end)
+    if len(seg.end) > after:
+      return seg
+    for line in lines[1:]:
+      # torn lines from crashes mid-append are dropped
+      try:
+        seg.add(json.loads(line))
+      except ValueError:
+        continue
+    return seg
+
+  # add records 'logs' (dicts with the keys in 'log_fields') to the log
+  # returns True if the log was created
+  def append(self, logs):
+    with self.locked():
+      self.migrate()
+      return self.add(logs)
+
+  # add records to the log, with the lock held
+  #	they're appended to their months' tails, and tails which are big or
+  #	of months gone by are folded into their segments
+  # returns True if the log was created
+  def add(self, logs):
+    created = not self.index() and not self.tails()
+
+    # group records by month of end date
+    months = {}
+    for log in logs:
+      month = log['end_date'][:7] if log_day(log['end_date']) else 'undated'
+      months.setdefault(month, []).append(log)
+
+    this_month = datetime.date.today().isoformat()[:7]
+    for month, month_logs in months.items():
+      if self.stale_tail(month):
+        os.remove(self.tail_file(month))
+      lines = [json.dumps(log) for log in month_logs]
+      with open(self.tail_file(month), 'a+b') as f:
+        if not f.tell():
+          lines.insert(0, json.dumps({'after': self.segment_count(month)}))
+        else:
+          # end a torn line from a crash mid-append, rather than add to it
+          f.seek(-1, os.SEEK_END)
+          if f.read(1) != b'\n':
+            lines.insert(0, '')
+        f.write(('\n'.join(lines)+'\n').encode())
+        f.flush()
+        os.fsync(f.fileno())
+        size = f.tell()
+      if size > self.tail_size or month != this_month:
+        self.fold(month)
+    return created
+
+  # fold the tail of 'month' into its segment, with the lock held
+  def fold(self, month):
+    seg = self.segment(month)
+    if len(seg.end) > self.segment_count(month):
+      index = self.index()
+      index[month] = [min(seg.end), max(seg.end), len(seg.end)]
+      self.write_index(index)
+      seg.write(self.segment_file(month))
+    os.remove(self.tail_file(month))
+
+  # segments with any end dates from day 'first' to day 'last', with
+  #	what's in their tails
+  # returns list of segments, oldest first
+  def segments(self, first=0, last=float('inf')):
+    with self.locked():
+      self.migrate()
+      months = {month for month, (lo, hi, count) in self.index().items()
+          if lo <= last and hi >= first}
+      for month in self.tails():
+        lo, hi = date_span(month) if month != 'undated' else (0, 0)
+        if lo <= last and hi >= first:
+          months.add(month)
+      segments = [self.segment(month) for month in sorted(months)]
+    return [seg for seg in segments if len(seg.end)]
+
+  # records with end dates from day 'first' to day 'last', oldest first
+  # returns list of dicts with the keys in 'log_fields'
+  def records(self, first=0, last=float('inf')):
+    out = []
+    for seg in self.segments(first, last):
+      out.extend(seg.records(first, last))
+    out.sort(key=lambda log: log['end_date'])
+    return out
+
+  # move records from the csv log of previous versions into segments,
+  #	with the lock held
+  def migrate(self):
+    if not self.csv_file or not os.path.isfile(self.csv_file):
+      return
+    with open(self.csv_file, newline='') as f:
+      logs = [{field: row.get(field) or '' for field in log_fields}
+          for row in csv.DictReader(f)]
+    self.add(logs)
+    os.replace(self.csv_file, self.csv_file+'.migrated')
+    # statistics cached from it are out of date
+    if os.path.isfile(self.csv_file+'.stats'):
+      os.remove(self.csv_file+'.stats')
+
+
+# version of the aggregates below, so a cache of older ones is ignored
+stats_version = 2
+
+# buckets of days from start to finish, as (upper limit, label)
+lead_buckets = [(0, 'same day'), (7, 'within a week'), (30, 'within a month'),
+    (91, 'within 3 months'), (365, 'within a year'), (float('inf'), 'longer')]
+
+
+# aggregate the log of finished tasks 'log' (a task_log)
+#	uses pandas and numpy, imported here rather than at the top since
+#	they're slow to import and nothing else needs them
+# returns dict of aggregates, as plain python values so they can be
+#	cached without pandas, or None if nothing's been logged
+def log_stats(log):
+  try:
+    import numpy as np
+    import pandas as pd
+  except ImportError:
+    raise AssertionError("'stats' needs pandas, try 'pip install pandas'")
+
+  segments = log.segments()
+  if not segments:
+    return None
+  # columns of all segments joined end to end, as numpy arrays; parent
+  #	paths and commands are turned into top-level names / commands
+  #	through each segment's own lists
+  column = lambda col: np.concatenate(
+      [np.frombuffer(getattr(seg, col), dtype=getattr(seg, col).typecode)
+      for seg in segments])
+  start = column('start').astype(np.int64)
+  end = column('end').astype(np.int64)
+  commands = pd.Series(np.concatenate([np.array(seg.commands, dtype=object)
+      [np.frombuffer(seg.command, dtype='H')] for seg in segments]))
+  # top-level task each was under, or itself if it was top-level
+  tops = []
+  for seg in segments:
+    paths = [json.loads(path) for path in seg.paths]
+    top = np.array([path[0] if path else None for path in paths],
+        dtype=object)[np.frombuffer(seg.parents, dtype='I')]
+    names = np.array(seg.names, dtype=object)
+    tops.append(np.where(top == None, names, top))
+  tops = pd.Series(np.concatenate(tops))
+
+  dated = end[end > 0]
+  day_str = lambda day: datetime.date.fromordinal(int(day)).isoformat()
+  stats = {
+      'finished'  : len(end),
+      'first'     : day_str(dated.min()) if len(dated) else '',
+      'last'      : day_str(dated.max()) if len(dated) else '',
+      'commands'  : [(command, int(count))
+          for command, count in commands.value_counts().items()]
+      }
 
+  # finished per week, Monday to Sunday, including weeks with none
+  #	day number 1 is a Monday, so weeks start at days 1, 8, 15, ...
+  stats['weeks'] = []
+  if len(dated):
+    week = (dated - 1) // 7
+    counts = np.bincount(week - week.min())
+    stats['weeks'] = [(day_str((week.min() + i) * 7 + 1), int(count))
+        for i, count in enumerate(counts)]
+
+  # days from start to finish, for tasks whose start date is known
+  lead = pd.Series((end - start)[(start > 0) & (end > 0)])
+  stats['lead'] = {
+      'count'     : len(lead),
+      'mean'      : float(lead.mean()) if len(lead) else 0.0,
+      'median'    : float(lead.median()) if len(lead) else 0.0,
+      'p90'       : float(lead.quantile(0.9)) if len(lead) else 0.0,
+      'max'       : int(lead.max()) if len(lead) else 0
+      }
+  limits = [-float('inf')] + [limit for limit, label in lead_buckets]
+  labels = [label for limit, label in lead_buckets]
+  counts = pd.cut(lead, limits, labels=labels).value_counts(sort=False)
+  stats['lead_buckets'] = [(label, int(counts[label])) for label in labels]
+
+  # finished under each top-level task
+  stats['parents'] = [(name, int(count))
+      for name, count in tops.value_counts().head(100).items()]
+
+  return stats
+
+
+# aggregates of the log of finished tasks 'log' (see log_stats), kept in
+#	a cache file in the log's directory and only worked out again if
+#	the log has changed (see task_log.stamp)
+# returns dict of aggregates, or None if nothing's been logged
+def cached_log_stats(log):
+  # bring in a log from previous versions first, if there is one
+  with log.locked():
+    log.migrate()
+  stamp = log.stamp()
+  if not stamp:
+    return None
+  key = (stats_version, stamp)
+
+  cache_file = os.path.join(log.path, 'stats')
+  try:
+    with open(cache_file, 'rb') as f:
+      cache = pickle.load(f)
+    if cache['key'] == key:
+      return cache['stats']
+  except (OSError, pickle.UnpicklingError, EOFError, KeyError, TypeError):
+    pass
+
+  stats = log_stats(log)
+  tmp_file = f'{cache_file}.{os.getpid()}.tmp'
+  with open(tmp_file, 'wb') as f:
+    pickle.dump({'key': key, 'stats': stats}, f)
+  os.replace(tmp_file, cache_file)
+  return stats
+
+
+# describe records of finished tasks 'logs' (as from task_log.records)
+#	for the 'log' command
+# returns string
+def log_report(logs):
+  if not logs:
+    return 'nothing finished then'
+  out = []
+  for log in logs:
+    line = f"{log['end_date']}  {log['name']}"
+    parents = json.loads(log['parents'] or '[]')
+    if parents:
+      line += '  (in: '+' > '.join(parents)+')'
+    out.append(line)
+  out.append(f'{len(logs)} finished')
+  return '\n'.join(out)
+
+
+# bar of '#' for 'count' out of 'most', at most 'width' long
+def bar(count, most, width=30):
+  return '#' * (round(count / most * width) if most else 0)
+
+
+# describe aggregates of the log 'stats' and open tasks 'oldest'
+#	(as from task_list.oldest) for the 'stats' command
+#	'weeks' and 'parents' are how many of each to show
+# returns string
+def stats_report(stats, oldest, weeks=12, parents=10):
+  out = []
+  if not stats:
+    out.append('no finished tasks logged yet')
+  else:
+    out.append(f"finished tasks: {stats['finished']}"
+        f" ({stats['first']} to {stats['last']})")
+    out.append('  '+', '.join(f'{command} {count}'
+        for command, count in stats['commands']))
+
+    shown = stats['weeks'][-weeks:]
+    if shown:
+      most = max(count for week, count in shown)
+      out.append(f'\nfinished per week, last {len(shown)} weeks logged:')
+      for week, count in shown:
+        out.append(f'  {week}  {count:5}  {bar(count, most)}')
+
+    lead = stats['lead']
+    if lead['count']:
+      out.append(f"\ndays from start to finish, {lead['count']} tasks:")
+      out.append(f"  median {lead['median']:g}, mean {lead['mean']:.1f},"
+          f" 90% within {lead['p90']:g}, longest {lead['max']}")
+      most = max(count for label, count in stats['lead_buckets'])
+      for label, count in stats['lead_buckets']:
+        out.append(f'  {label:16}{count:6}  {bar(count, most)}')
+
+    out.append(f'\nfinished under each top-level task, top {parents}:')
+    for name, count in stats['parents'][:parents]:
+      out.append(f'  {count:6}  {name}')
+
+  if oldest:
+    out.append('\noldest open tasks:')
+    for t in oldest:
+      out.append(f'  {t.start_date}  {t.ID_str} {t.name}')
+
+  return '\n'.join(out)
+
+
+
+############################################################################
+#
+#	named lists
+#
+############################################################################
 
 
+# what 'command' ('find' or 'stats') says about one to-do list, read
+#	from its 'files': save file, write-ahead log, and directory and old
+#	csv file (or None) of the log of finished tasks (see task_log)
+#	the list is read without its lock (see write_ahead_log.read), so a
+#	process busy with it doesn't hold this up
+#	'main' is the words to find
+# returns string
+def list_report(command, files, main=None):
+  save_file, wal_file, log_path, csv_file = files
+  todo_list = write_ahead_log(wal_file, save_file).read()
+  if command == 'find':
+    return todo_list.find(main)
+  log = task_log(log_path, csv_file=csv_file)
+  return stats_report(cached_log_stats(log), todo_list.oldest())
+
+
+# run 'list_report' in a new process, on this file (see the end of it)
+#	rather than forking, which isn't safe with other threads running,
+#	as they are in the editor loop (see write_ahead_log.write_behind)
+# returns string
+# throws what went wrong in the process
+def list_report_process(args):
+  done = subprocess.run([sys.executable, os.path.abspath(__file__)],
+      input=pickle.dumps(args), capture_output=True)
+  assert done.returncode == 0 and done.stdout, \
+      'reading the list failed: '+done.stderr.decode().strip()
+  ok, out = pickle.loads(done.stdout)
+  if not ok:
+    raise out
+  return out
+
+
+# run 'list_report' on each of 'lists' (dict of files by list name) in
+#	parallel, one process per list up to the number of CPUs, so that
+#	going through them all takes about as long as the biggest one
+# returns dict of reports by list name
+def across_lists(command, lists, main=None):
+  if not lists:
+    return {}
+  workers = min(len(lists), os.cpu_count() or 1)
+  with concurrent.futures.ThreadPoolExecutor(workers) as pool:
+    reports = pool.map(list_report_process,
+        [(command, files, main) for files in lists.values()])
+    return dict(zip(lists, reports))
+
+
+# as run by 'list_report_process': arguments for 'list_report' are
+#	pickled on stdin, and (True, report) or (False, what went wrong)
+#	goes pickled to stdout
+if __name__ == '__main__':
+  args = pickle.load(sys.stdin.buffer)
+  try:
+    out = (True, list_report(*args))
+  except Exception as error:
+    out = (False, error)
+  pickle.dump(out, sys.stdout.buffer)
@@ -2,23 +2,61 @@
 
 import os
 import sys
-import pickle
-import readline
-import shlex
-import copy
-import pandas as pd
+import re
+import socket
+import json
 
-from tasker import *
+# the rest, tasker.py included, is imported further down, once the daemon
+#	(if one is running) has turned the command down; see 'forward'
 
 # location of data directory
 data_dir = os.path.expanduser('~/Documents/todo/pickle_jar/')
 
-# locations within data directory
-save_filepath = data_dir+'todo.pickle'
-backup_filepath = data_dir+'backup.pickle'
-
-# location of log file
-log_filepath = data_dir+'task_log.csv'
+# list used unless another is named with '-list <name>'
+#	each list has files of its own in the data directory, named after it
+default_list = 'todo'
+
+# locations within data directory of the files of list 'name'
+#	save		save file
+#	backup		where 'backup' writes the save file
+#	wal		write-ahead log of changes since save file was written
+#	sock		socket the daemon listens on, if it's running
+#	log		log of finished tasks, a directory of monthly segments
+#	the default list keeps the names its files had before there were
+#	other lists
+# returns dict of paths
+def list_files(name):
+  prefix = data_dir+name+'.' if name != default_list else data_dir
+  return {
+      'save'    : data_dir+name+'.pickle',
+      'backup'  : prefix+'backup.pickle',
+      'wal'     : data_dir+name+'.wal',
+      'sock'    : data_dir+name+'.sock',
+      'log'     : prefix+'task_log/'
+      }
+
+# names of lists which have save files, sorted
+#	(backups aren't lists, and names are made of word characters only,
+#	so backups of other lists aren't mistaken for lists either)
+def list_names():
+  names = []
+  for f in os.listdir(data_dir):
+    name, ext = os.path.splitext(f)
+    if ext == '.pickle' and re.fullmatch(r'\w+', name) and name != 'backup':
+      names.append(name)
+  return sorted(names)
+
+# size in bytes past which the log is compacted into a new save file
+wal_compact_size = 256*1024
+
+# location of log file of previous versions, moved into the default
+#	list's log of finished tasks
+log_csv_filepath = data_dir+'task_log.csv'
+
+# log of finished tasks of list 'name'
+def list_log(name):
+  return task_log(list_files(name)['log'],
+      csv_file=log_csv_filepath if name == default_list else None)
 
 
 ############################################################################
@@ -53,21 +91,54 @@ todo - command line to-do list
 
 usage:
   <command> <args>
+  -list <name> <command> <args>	use list <name> rather than the default;
+            each list is kept in files of its own, and only
+            loaded when used (given when starting the editor,
+            it's used for the whole session)
 
 commands and arguments:
 <id> means a period-delimited list of numbers, e.g. 1.4.2
 <name> means a string (quotes optional), e.g. check email
+<ids> means tasks picked out by any of:
+  <id>...				the tasks with these IDs
+  2.*					every subtask of 2 ('*' works at any level)
+  3.1-3.40, 3.1-40		subtasks 1 to 40 of 3
+  -depth <int>			only tasks at depth <int> (1 for top-level)
+  -format <str>			only tasks with format <str>
+  -older <age>			only tasks started more than <age> ago,
+            e.g. 30d, 2w, 6m, 1y
+  with only flags, they pick from all tasks (or all under the focus)
 
   help				print a help text very much like this one
 
-  list				print to-do list
+  list				print to-do list, as much as fits in the terminal
     [-sub <id>]			only print specified task and subtasks
+    [-page <int>]		print page <int> of a list too long to fit
+    [-rows <int>]		print <int> rows per page (0 for no limit)
+
+  next, prev			print next / previous page of to-do list
+
+  find <words>			list tasks with all of <words> in their names,
+            with the tasks they're under
+    [-all]				look in every list, in parallel
+
+  stats				print statistics of finished tasks from the log:
+            finished per week, days from start to finish,
+            finished under each top-level task; and oldest open tasks
+    [-all]				for every list, in parallel
+
+  lists				print names of lists, marking the one in use
+
+  log [<date>]		list tasks finished in month or day <date>
+            (YYYY-MM or YYYY-MM-DD), by default this month
+    [-from <date>]		finished from <date> on
+    [-to <date>]		finished up to <date>
 
   add <name>			add a task
     [-sub <id>]			add as subtask of specified task
     [-top]				at at top of list (rather than default bottom)
 
-  rm <id>				remove a task
+  rm <ids>				remove tasks, e.g. 'rm -older 1y'
   finish, remove, fin		aliases for rm
 
   rename <id> [<name>]	rename a task; if name is not specified,
@@ -75,19 +146,24 @@ commands and arguments:
     [-add]					append instead of replacing
 
   move <id>			move a task; requires one of the following:
-    -into <id2>			make a subtask of <id2>
+    -into <id2>			make a subtask of <id2>; takes <ids> too
     -to <id2>			move to position <id2>
     -upto <int>			move up to rank <int> within parent
     -upby <int>			move up <int> ranks within parent
     -downto <int>		move down to rank <int> within parent
     -downby <int>		move down <int> ranks within parent
 
-  fold <id>			fold a task, i.e. children are not printed
+  fold <ids>			fold tasks, i.e. children are not printed
     [-all]				fold all top-level tasks
 
-  unfold <id>			unfold a task
+  unfold <ids>			unfold tasks, bringing back archived subtasks
     [-all]				unfold all top-level tasks
 
+  archive <ids>		set aside subtasks of tasks in a file of their own,
+            so the rest of the list loads and saves without them;
+            unfolding or focusing on a task brings them back,
+            e.g. 'archive -depth 1 -older 6m'
+
   focus <id>			focus on specified task; equivalent to always
             including '-sub <id>' in commands that accept it
 
@@ -97,23 +173,46 @@ commands and arguments:
 
   close				equivalent to fold (current focus task) + unfocus
 
-  format <id> <str>	format a task with format <str>
+  format <ids> <str>	format tasks with format <str>
             to see known formats, try it and the error will say
 
   undo				undo the last relevant command
             e.g. add/rm/move/etc but not focus/unfocus/open/etc
-            by default, last 10 states saved
+            by default, last 1000 commands can be undone
+
+  batch [<file>]		run commands from <file>, or stdin, one per line
+            saved and undone as one command, and stops without
+            changing anything if one of them fails
+
+  import <file>		add tasks from an outline: indented text, or
+            Markdown (.md) or JSON (.json); undone as one command
+    [-sub <id>]			add under specified task
+    [-kind <kind>]		read as text, md or json, whatever the extension
+
+  export <file>		write to-do list to an outline, as for import
+    [-sub <id>]			only write specified task and subtasks
+    [-kind <kind>]		write as text, md or json, whatever the extension
 
   full_upgrade		upgrade from a previous version (rarely needed)
 
+  daemon				keep to-do list loaded in a background process, which
+            later 'todo <command>' calls hand their commands to
+    [stop]				stop the daemon
+
 universal arguments, can be passed with any command
 
   -verbose			re-throws errors that are normally handled by
             a chiding print statement
+
+  -quiet				doesn't clear screen and print to-do list
+
+  -timing				prints how long each phase of the command took
+
+  -profile <file>		writes cProfile stats for the command to <file>
 """.replace('\t', '    ')
 
 # to print if save filepath is rejected
-save_filepath_help = 'You can edit this script to change save_filepath to the desired location.'
+save_filepath_help = 'You can edit this script to change data_dir to the desired location.'
 
 # to print along with error messages
 error_help = "To check usage, use 'help'."
@@ -133,7 +232,65 @@ Tasks are located by ID, a collection of numbers specifying subtask indices.
 - IDs are used internally as lists of ints indexing by 0,
   e.g. [ 0, 3, 1 ]	(corresponding to '1.4.2' above).
 - utilities ID_to_list and ID_to_str convert between them
-- each task stores its own ID, which is updated whenever it may have changed
+- each task keeps a link to its parent and its position there, and its
+  ID is worked out from those when needed (see task.ID_list)
+- each task also has a key, which never changes, and the focus is kept
+  by key so that it stays on the same task when others move around it
+  (see task_list.task_by_key)
+
+Changes are saved by appending to a write-ahead log (see class
+write_ahead_log in tasker.py) rather than rewriting the save file
+- task_list methods record each change they make as a small operation
+- execute() runs each command in a transaction, which commits its
+  operations as one log record
+- on startup, records newer than the save file are replayed
+- when the log gets big, a new save file is written in the background
+- in the editor loop, a background thread syncs the log and compacts it,
+  and is waited for before exiting
+- undo history is kept in a file of its own next to the save file (see
+  class undo_history in tasker.py), read only when undo gets to it
+- subtasks set aside by 'archive' are kept in files of their own in
+  '<save file>.shards', each read only when its task is unfolded or
+  focused on; compacting removes the ones nothing refers to any more
+
+'todo daemon' keeps a to-do list in memory and takes commands over a
+Unix socket (see serve / forward below)
+- 'todo <command>' hands its command to the daemon if it's running,
+  and prints the output it sends back
+- otherwise, or if the command needs to ask for input, it runs as usual
+- tasker.py and most modules are only imported once it's clear the
+  command runs here, so handing it to the daemon starts up quickly
+
+Several processes may use the same files at once
+- each command that changes the list holds a lock while it catches up
+  with changes saved by other processes, makes its own, and appends them
+  to the log; commands that only look at the list just catch up
+- anything typed in (e.g. the new name for 'rename') is asked for before
+  taking the lock, so others aren't kept waiting meanwhile
+- save files are written to a temporary file which is renamed into place
+
+Tasks removed with rm are recorded in the log of finished tasks (see
+class task_log in tasker.py)
+- one file per month, holding that month's records as columns
+- each rm appends to a small tail file for the month, which is folded
+  into the month's file once it's big or the month is over
+- an index of the dates in each file, so 'log' only reads the months
+  it's asked about
+- 'stats' reads all of it, and caches what it works out
+
+Each list named with '-list <name>' has files of its own (see list_files)
+- 'todo' is the default list, and keeps the file names from before
+- only the list in use is loaded; 'find -all' and 'stats -all' read the
+  rest in worker processes, one list each (see across_lists in
+  tasker.py), without taking their locks, so a list busy in another
+  process doesn't hold them up
+
+In the editor loop, the list stays drawn at the top of the screen (see
+class screen in tasker.py)
+- after each command, only the lines of it that changed are rewritten,
+  using ANSI cursor addressing
+- the screen is cleared and drawn afresh only if the terminal was
+  resized, or enough was printed below the list to scroll it
 
 Arguments are read from input() into a dict (see parse_args utility)
 - some are standalone flags, and are set to True if received
@@ -182,14 +339,68 @@ if '-noshow' in sys.argv:
 else:
   show_description = True
 
+# check for list to use on startup
+if '-list' in sys.argv:
+  i = sys.argv.index('-list')
+  list_name = sys.argv[i+1] if i + 1 < len(sys.argv) else ''
+  del sys.argv[i:i+2]
+  if not re.fullmatch(r'\w+', list_name) or list_name == 'backup':
+    print(f"can't use '{list_name}' as a list name; use letters, digits"
+        " and _ (and not 'backup')")
+    sys.exit()
+else:
+  list_name = default_list
+
+# files of the list in use
+files = list_files(list_name)
+save_filepath = files['save']
+backup_filepath = files['backup']
+wal_filepath = files['wal']
+sock_filepath = files['sock']
+log_dirpath = files['log']
+
+# page of the to-do list being shown
+page = 1
+
+# commands which only look at the list, so don't need to hold the lock
+#	while they run
+read_only = ['list','l','next','prev','find','stats','log','export','lists',
+    'backup']
+
+# whether a batch is running (see 'batch'), which logs the tasks its
+#	commands finish once it's saved as a whole
+batching = False
+
+# records of tasks finished by the command running, to be logged once
+#	the command is saved
+finished = []
+
+
+# screen the editor loop draws on (see class screen), None otherwise
+display = None
+
+# clear screen and print the to-do list, as 'args' ask for it, or in the
+#	editor loop, redraw just the lines that changed
+def show(todo_list, clear_buffer=True, **args):
+  if display:
+    with timing('render'):
+      display.draw(todo_list.ls(**args).split('\n'), clear_buffer)
+  else:
+    with timing('clear screen'):
+      clear_screen(clear_buffer=clear_buffer)
+    with timing('render'):
+      print(todo_list.ls(**args))
+  print()
+
 
 #
 #	big ol' function to wrap execution of a command
 #
 
-def execute(todo_list, line=False, clear_buffer=True):
+# returns False if the command failed
+def execute(todo_list, line=False, clear_buffer=True, quiet=False):
 
-  global verbose
+  global verbose, page
 
   # if no input, go again
   if not line:
@@ -204,8 +415,6 @@ def execute(todo_list, line=False, clear_buffer=True):
   if '-quiet' in line:
     quiet = True
     line.remove('-quiet')
-  else:
-    quiet = False
 
   # read command and arguments
   command = line[0]
@@ -216,7 +425,7 @@ def execute(todo_list, line=False, clear_buffer=True):
     print(error.args[0])
     if verbose:
       raise error
-    return
+    return False
 
   # handle special commands
   if command == 'exit':
@@ -228,86 +437,374 @@ def execute(todo_list, line=False, clear_buffer=True):
   # string describing changes made
   description = False
 
+  # forget tasks finished by commands that failed
+  if not batching:
+    finished.clear()
+
   # execute command
   try:
-    if command == 'add': description = todo_list.add(**args)
-    elif command in ['rm','remove','forget','finish','fin']:
-      description, logs = todo_list.remove(**args)
-      # save data about the task
-      try:
-        data = pd.read_csv(log_filepath)
-      except FileNotFoundError:
-        description += f'\ncreating logfile at {log_filepath}\n'
-        data = {
-            'name'        : [],
-            'ID_str'      : [],
-            'parents'     : [],
-            'start_date'  : [],
-            'end_date'    : [],
-            'command'     : []
-            }
-        data = pd.DataFrame(data)
-      for log in logs:
-        log['command'] = command
-        data = data.append(log, ignore_index=True)
-      data.to_csv(log_filepath, index=False)
-    elif command == 'move': description = todo_list.move(**args)
-    elif command in ['rename','edit']:
-      description = todo_list.rename(**args)
-    elif command == 'format': description = todo_list.format_task(**args)
-    elif command == 'fold': description = todo_list.fold(**args)
-    elif command == 'unfold': description = todo_list.unfold(**args)
-    elif command == 'update': description = todo_list.update_IDs()
-    elif command == 'focus': description = todo_list.set_focus(**args)
-    elif command == 'unfocus': description = todo_list.unset_focus(**args)
-    elif command == 'open': description = todo_list.open_task(**args)
-    elif command == 'close': description = todo_list.close_task(**args)
-    elif command == 'undo': description = todo_list.undo(**args)
-    elif command == 'full_upgrade': description = todo_list.full_upgrade()
-    # special commands that don't fall through to save and print
-    elif command == 'backup':
-      save_tasks(todo_list, backup_filepath)
-      print('backed up.')
-      return
-    elif command in ['list','l']:
-      # clear screen and list without saving
-      clear_screen(clear_buffer=clear_buffer)
-      print(todo_list.ls(**args))
-      print()
-      return
-    else:
-      assert False, "command '"+command+"' not recognized."
+    # anything to be typed in is asked for before the command takes the
+    #	lock, so other processes aren't kept waiting on it meanwhile
+    #	(not in a batch, which has the lock already)
+    if command in ['rename','edit'] and 'main' in args and not batching \
+        and not parse_ID_name(args['main'])[1]:
+      wal.catch_up(todo_list)
+      args['main'] = todo_list.ask_name(args['main'])
+      # the whole name was there to edit, so nothing is added to it
+      args.pop('add', None)
+    elif command == 'batch':
+      lines = batch_lines(**args)
+
+    # catch up with other processes, and save changes when done
+    #	(commands that only look at the list just catch up)
+    context = wal.reading if command in read_only else wal.transaction
+    with context(todo_list), timing('command'):
+      if command == 'add': description = todo_list.add(**args)
+      elif command in ['rm','remove','forget','finish','fin']:
+        description, logs = todo_list.remove(**args)
+        # save data about the task, once the removal is saved
+        for log in logs:
+          log['command'] = command
+        finished.extend(logs)
+      elif command == 'move': description = todo_list.move(**args)
+      elif command in ['rename','edit']:
+        description = todo_list.rename(**args)
+      elif command == 'format': description = todo_list.format_task(**args)
+      elif command == 'fold': description = todo_list.fold(**args)
+      elif command == 'unfold': description = todo_list.unfold(**args)
+      elif command == 'archive': description = todo_list.archive(**args)
+      elif command == 'update': description = todo_list.update_IDs()
+      elif command == 'focus': description = todo_list.set_focus(**args)
+      elif command == 'unfocus': description = todo_list.unset_focus(**args)
+      elif command == 'open': description = todo_list.open_task(**args)
+      elif command == 'close': description = todo_list.close_task(**args)
+      elif command == 'undo': description = todo_list.undo(**args)
+      elif command == 'batch': description = batch(todo_list, lines, **args)
+      elif command == 'import': description = todo_list.import_tasks(**args)
+      elif command == 'export':
+        # writes a file, but changes nothing
+        print(todo_list.export_tasks(**args))
+        return
+      elif command == 'full_upgrade':
+        description = todo_list.full_upgrade()
+        # upgrade isn't recorded in the log, so write a new save file now
+        wal.compact(todo_list, background=False)
+      # special commands that don't fall through to save and print
+      elif command == 'backup':
+        save_tasks(todo_list, backup_filepath)
+        print('backed up.')
+        return
+      elif command in ['list','l']:
+        # remember page for 'next' / 'prev' and listing after commands
+        page = int(args.get('page', 1))
+        # clear screen and list without saving
+        show(todo_list, clear_buffer, **args)
+        return
+      elif command == 'stats':
+        # print statistics, leaving the list on screen
+        if args.get('all'):
+          print(every_list(todo_list, 'stats'))
+        else:
+          print(stats_report(cached_log_stats(finished_log),
+              todo_list.oldest()))
+        return
+      elif command == 'log':
+        # tasks finished between '-from' and '-to', or in the month or
+        #	day 'main', by default this month
+        if 'from' in args or 'to' in args:
+          first = date_span(args['from'])[0] if 'from' in args else 0
+          last = date_span(args['to'])[1] if 'to' in args else float('inf')
+        else:
+          month = datetime.date.today().isoformat()[:7]
+          first, last = date_span(args.get('main', month))
+        print(log_report(finished_log.records(first, last)))
+        return
+      elif command == 'find':
+        # print what's found, leaving the list on screen
+        if args.pop('all', False):
+          print(every_list(todo_list, 'find', **args))
+        else:
+          print(todo_list.find(**args))
+        return
+      elif command == 'lists':
+        # names of lists, marking the one in use
+        for name in sorted(set(list_names()) | {list_name}):
+          print(('* ' if name == list_name else '  ')+name)
+        return
+      elif command in ['next','prev']:
+        # move a page, staying within the pages there are
+        if command == 'prev':
+          page = max(page - 1, 1)
+        elif todo_list.has_page(page + 1):
+          page += 1
+        show(todo_list, clear_buffer, page=page)
+        return
+      else:
+        assert False, "command '"+command+"' not recognized."
+    # log finished tasks now that their removal is saved, unless they're
+    #	part of a batch, which does that once it's all saved
+    if finished and not batching:
+      with timing('task log'):
+        created = finished_log.append(finished)
+      finished.clear()
+      if created:
+        description += f'\ncreating log at {log_dirpath}\n'
   # some methods throw AssertionError if they're unhappy
   except AssertionError as error:
     print(error.args[0])
     print(error_help)
     if verbose:
       raise error
-    return
+    return False
   # may incur TypeError if arguments are incorrect
   except TypeError as error:
     print("Error passing arguments to '"+command+"'.")
     print(error_help)
     if verbose:
       raise error
-    return
+    return False
 
   # clear screen and print
   if not quiet:
-    clear_screen(clear_buffer=clear_buffer)
-    print(todo_list.ls())
-    print()
+    show(todo_list, clear_buffer, page=page)
 
   # print description if there's anything to say
   if description and show_description:
     print(description.strip())
 
-  # save todo list
-  save_tasks(todo_list, save_filepath)
-
 #
 #	end of execute function
 #
+
+
+# run a command with execute, timing and / or profiling it if asked
+#	'-timing' prints how long each phase of the command took
+#	'-profile <file>' writes cProfile stats for the command to <file>,
+#		to read with pstats
+#	if timing was started before loading the list (see below), the
+#	load is included
+def run(todo_list, line, clear_buffer=True):
+  profile_file = None
+  if '-profile' in line:
+    i = line.index('-profile')
+    if i + 1 < len(line):
+      profile_file = line[i+1]
+      del line[i:i+2]
+  timed = '-timing' in line
+  if timed:
+    line.remove('-timing')
+    if timing.times is None:
+      timing.start()
+
+  profile = cProfile.Profile() if profile_file else None
+  try:
+    if profile:
+      profile.enable()
+    execute(todo_list, line, clear_buffer=clear_buffer)
+  finally:
+    if profile:
+      profile.disable()
+      profile.dump_stats(profile_file)
+      print(f'profile written to {profile_file}')
+    if timed:
+      times, total = timing.stop()
+      print('timing:')
+      for name, seconds in times.items():
+        print(f'  {name:16}{seconds*1000:9.2f} ms')
+      print(f'  {"other":16}{(total - sum(times.values()))*1000:9.2f} ms')
+      print(f'  {"total":16}{total*1000:9.2f} ms')
+
+
+# run 'find' (for words 'main') or 'stats' on every list, and say what
+#	it found under each list's name
+#	the list in use is loaded already, so it's done here, and the rest
+#	in parallel in worker processes (see across_lists)
+# returns string
+def every_list(todo_list, command, main=None):
+  if command == 'find':
+    assert main, 'no words to find'
+    reports = {list_name: todo_list.find(main)}
+  else:
+    reports = {list_name:
+        stats_report(cached_log_stats(finished_log), todo_list.oldest())}
+  others = {}
+  for name in list_names():
+    if name != list_name:
+      f, log = list_files(name), list_log(name)
+      others[name] = (f['save'], f['wal'], log.path, log.csv_file)
+  with timing('other lists'):
+    reports.update(across_lists(command, others, main))
+
+  out = []
+  for name, report in sorted(reports.items()):
+    if command == 'find' and report == 'no tasks found':
+      continue
+    lines = ['  '+line if line else '' for line in report.split('\n')]
+    out.append(name+':\n'+'\n'.join(lines))
+  return '\n\n'.join(out) or 'no tasks found'
+
+
+# commands which can't be part of a batch
+batch_forbidden = ['undo', 'full_upgrade', 'exit']
+
+# lines of commands for 'batch', read from file 'main', or stdin if not
+#	given, before the batch takes the lock
+# returns list of lines
+def batch_lines(main=None):
+  # stdin is left open for the editor loop to carry on with
+  with open(main) if main else nullcontext(sys.stdin) as f:
+    return f.readlines()
+
+# run commands 'lines', one per line, from file 'main' or stdin
+#	the batch is one transaction and one undo step, so it's saved once
+#	and undone all at once, and the list is only printed at the end
+#	what the commands say is held back until the batch has run, and
+#	then said after the list; if a command fails, the batch stops and
+#	nothing is changed, so only what went wrong is said
+# returns string describing the batch
+def batch(todo_list, lines, main=None):
+  global batching
+  count = 0
+  said = []
+  batching = True
+  try:
+    with todo_list.undo_step():
+      for number, text in enumerate(lines, 1):
+        line = shlex.split(text, comments=True)
+        if not line:
+          continue
+        assert line[0] not in batch_forbidden, \
+            f"line {number}: '{line[0]}' can't be used in a batch"
+        out = io.StringIO()
+        with redirect_stdout(out):
+          ok = execute(todo_list, line, quiet=True) is not False
+        if not ok:
+          print(out.getvalue(), end='')
+        assert ok, f'line {number} failed, batch not run'
+        said.append(out.getvalue())
+        count += 1
+  finally:
+    batching = False
+
+  return ''.join(said)+f'ran {count} commands from {main or "stdin"}'
+
+
+# commands which ask for input or read files, so can't be handed to the daemon
+def interactive(line):
+  # rename without a new name gives the current one for editing
+  words = [arg for arg in line[1:] if not arg.startswith('-')]
+  # batch, import and export read and write files where they're run, and
+  #	so does -profile
+  return (line[0] in ['rename','edit'] and len(words) <= 1
+      or line[0] in ['batch', 'import', 'export'] or '-profile' in line)
+
+
+# hand a command to the daemon, if it's running, and print its output
+# returns True if the daemon took it
+def forward(line):
+  try:
+    s = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+    s.connect(sock_filepath)
+  except OSError:
+    return False
+
+  # the daemon has no terminal, so tell it the size of this one
+  try:
+    size = list(os.get_terminal_size())
+  except OSError:
+    size = None
+  request = {
+      'line'              : line,
+      'size'              : size,
+      'verbose'           : verbose,
+      'show_description'  : show_description
+      }
+
+  with s:
+    try:
+      s.sendall(json.dumps(request).encode()+b'\n')
+    except OSError:
+      # the daemon went away before taking the command, so run it here
+      return False
+    reply = b''
+    try:
+      while chunk := s.recv(65536):
+        reply += chunk
+    except OSError:
+      pass
+
+  # if the daemon died part way through, the command may or may not
+  #	have been saved, so it's not safe to run it again here
+  try:
+    output = json.loads(reply)['output']
+  except (ValueError, KeyError, TypeError):
+    sys.exit("the daemon stopped without answering, so the command may or"
+        " may not have been carried out; check with 'todo list'")
+  sys.stdout.write(output)
+  return True
+
+
+# daemon: hold the to-do list in memory and run commands sent by 'forward'
+#	runs until sent 'daemon stop'
+def serve(todo_list):
+  global verbose, show_description, page
+
+  # clear away socket left by a daemon that didn't exit cleanly
+  if os.path.exists(sock_filepath):
+    os.remove(sock_filepath)
+  server = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+  # only the owner may connect
+  umask = os.umask(0o177)
+  try:
+    server.bind(sock_filepath)
+  finally:
+    os.umask(umask)
+  server.listen()
+  print(f'todo daemon listening on {sock_filepath}')
+
+  try:
+    while True:
+      conn, _ = server.accept()
+      with conn:
+        request = json.loads(conn.makefile('rb').readline())
+        line = request['line']
+
+        # handle commands for the daemon itself
+        if line[0] == 'daemon':
+          stop = line[1:] == ['stop']
+          output = 'daemon stopped\n' if stop else 'daemon already running\n'
+          conn.sendall(json.dumps({'output': output}).encode())
+          if stop:
+            break
+          continue
+
+        # run command as if from the client's terminal, capturing output
+        verbose = request['verbose']
+        show_description = request['show_description']
+        page = 1
+        if request['size']:
+          os.environ['COLUMNS'], os.environ['LINES'] = map(str, request['size'])
+        else:
+          os.environ.pop('COLUMNS', None)
+          os.environ.pop('LINES', None)
+
+        out = io.StringIO()
+        with redirect_stdout(out):
+          try:
+            run(todo_list, line, clear_buffer=False)
+          except SystemExit:
+            pass
+          except Exception as error:
+            print(f"{type(error).__name__}: {error}")
+            if verbose:
+              traceback.print_exc(file=out)
+
+        conn.sendall(json.dumps({'output': out.getvalue()}).encode())
+  finally:
+    server.close()
+    os.remove(sock_filepath)
+
+#
 #	beginning of active code
 #
 
@@ -317,12 +814,49 @@ def execute(todo_list, line=False, clear_buffer=True):
 #	enclose in \001 ... \002 to tell readline the characters are invisible
 blue	= "\001\033[38;2;135;206;235m\002"
 reg		= "\001\033[0m\002"
-prompt	= f"{blue}todo: >  {reg}"
+prompt_text = "todo: >  "
+prompt	= f"{blue}{prompt_text}{reg}"
+
+
+# if there's a daemon running, let it handle command line arguments
+if len(sys.argv) > 1 and not interactive(sys.argv[1:]):
+  if forward(sys.argv[1:]):
+    sys.exit()
+  elif sys.argv[1:] == ['daemon', 'stop']:
+    print('no daemon running')
+    sys.exit()
+
+
+# running the command here, so bring in what that takes
+import pickle
+import readline
+import shlex
+import copy
+import io
+import traceback
+import datetime
+import cProfile
+import atexit
+from contextlib import redirect_stdout, nullcontext
+
+from tasker import *
+
 
+# log of finished tasks
+finished_log = list_log(list_name)
 
-# read to-do list from file
+# write-ahead log of changes since the save file
+wal = write_ahead_log(wal_filepath, save_filepath,
+    compact_size=wal_compact_size)
+
+# time loading too, if the command is to be timed
+if '-timing' in sys.argv[1:]:
+  timing.start()
+
+# read to-do list from file, up to date with the log
 try:
-  todo_list = load_tasks(save_filepath)
+  with timing('load'):
+    todo_list = wal.load()
 # will incur AssertionError if file doesn't exist
 #	and user declines to create it
 except AssertionError as error:
@@ -333,6 +867,12 @@ except AssertionError as error:
   sys.exit()
 
 
+# if asked to be the daemon, do that until stopped
+if sys.argv[1:] == ['daemon']:
+  serve(todo_list)
+  sys.exit()
+
+
 # if we got command line arguments (besides -verbose), execute them and exit
 #	in this case also don't clear the scrollback buffer
 if len(sys.argv) > 1:
@@ -341,7 +881,7 @@ if len(sys.argv) > 1:
   line = sys.argv[1:]
 
   try:
-    execute(todo_list, line, clear_buffer=False)
+    run(todo_list, line, clear_buffer=False)
   except Exception as error:
     print(f"{type(error).__name__}: {error}")
     if verbose:
@@ -352,18 +892,47 @@ if len(sys.argv) > 1:
 
 # if no command line arguments,
 #	clear screen, print, and enter editor loop
+#	after that, the list is redrawn by rewriting the lines that changed
 
-clear_screen()
-print(todo_list.ls())
-print()
+display = screen(sys.stdout)
+sys.stdout = display
+show(todo_list)
+
+# report what went wrong saving in the background, if anything
+#	'wait' waits for everything to be saved first
+def check_saved(wait=False):
+  try:
+    if wait:
+      wal.flush()
+    else:
+      wal.check()
+  except Exception as error:
+    print(f"saving failed: {type(error).__name__}: {error}")
+    if verbose:
+      raise error
+
+# from here on, changes are synced to disk in the background, so the
+#	prompt comes back as soon as the list is redrawn; whatever's left is
+#	saved before exiting, however that happens
+wal.write_behind(todo_list)
+atexit.register(check_saved, wait=True)
 
 while True:
 
   try:
     # read a line of input and split shell-style into a list
-    line = shlex.split(input(prompt))
-
-    execute(todo_list, line)
+    text = input(prompt)
+    display.typed(prompt_text+text)
+    line = shlex.split(text)
+
+    # keep the background writer off the list while the command runs
+    with wal.mutex:
+      run(todo_list, line)
+    check_saved()
+  # Ctrl-D or Ctrl-C leaves, saving first as above
+  except (EOFError, KeyboardInterrupt):
+    print()
+    break
   except Exception as error:
     print(f"{type(error).__name__}: {error}")
     if verbose: